@@ -0,0 +1,474 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+ds_common.py
+------------
+Felles hjelpefunksjoner for .ds-eksportørene: innlesing, linjenummer,
+klamme-/parentesmatching, nøkkelordlinjer og JSON-skriving.
+
+Alt som avledes av en tekst (linjeindeks, klamme- og parentespar, seksjoner)
+ligger på et DsDocument som sendes gjennom kallene. Parene finnes i én
+passering over hele teksten, så hvert oppslag etterpå er et dict-oppslag.
+
+Matcherne returnerer alltid (start, slutt) som posisjoner i `text` og kopierer
+aldri ut innholdet; det gjør kallerne først når resultatet skal skrives.
+"""
+
+import json
+import mmap
+import os
+import platform
+import re
+import sys
+from bisect import bisect_left
+from functools import cached_property, wraps
+from typing import Any, Callable, Dict, Iterator, List, NamedTuple, Optional, Tuple, TypeVar
+
+try:
+    import orjson
+except ImportError:  # orjson er valgfri
+    orjson = None
+
+
+def read_text(path: str, errors: str = "strict") -> str:
+    """
+    Les filen som bytes og dekod den i én operasjon. Linjeskift normaliseres
+    som i tekstmodus, slik at posisjonene i JSON-utdataene ikke endres.
+    Parsingen skjer fortsatt på str: posisjonene er tegnposisjoner, og
+    .ds-filer inneholder ikke-ASCII-tekst (æøå) i displaynavn og meldinger.
+
+    Filen mappes med mmap og dekodes rett fra mappingen, så det lages ingen
+    bytes-kopi av hele filen i tillegg til teksten.
+    """
+    with open(path, "rb") as f:
+        if os.fstat(f.fileno()).st_size == 0:
+            # mmap støtter ikke tomme filer
+            return ""
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+            text = str(mm, "utf-8", errors)
+    if "\r" in text:
+        text = text.replace("\r\n", "\n").replace("\r", "\n")
+    return text
+
+
+def write_json(path: str, data: Any) -> None:
+    """
+    Skriv `data` som JSON med innrykk 2. Bruker orjson hvis det er installert
+    (samme utdata, men serialisert i C), ellers standardbiblioteket.
+    """
+    if orjson is not None:
+        with open(path, "wb") as f:
+            f.write(orjson.dumps(data, option=orjson.OPT_INDENT_2))
+        return
+    # json.dump skriver én liten bit per token; json.dumps bygger hele
+    # teksten først, så filen skrives i ett kall
+    with open(path, "w", encoding="utf-8") as f:
+        f.write(json.dumps(data, ensure_ascii=False, indent=2))
+
+
+NEWLINE_RE = re.compile("\n")
+
+
+def build_line_index(text: str) -> List[int]:
+    """Posisjonene til alle linjeskift i `text`, i stigende rekkefølge."""
+    # Søket går i C; bare listebyggingen skjer i Python
+    return [m.start() for m in NEWLINE_RE.finditer(text)]
+
+
+def char_to_line(newlines: List[int], idx: int) -> int:
+    # Antall linjeskift før idx, funnet med binærsøk i stedet for text.count
+    return bisect_left(newlines, idx) + 1
+
+
+# PyPy sin JIT gjør en enkel tegnløkke raskere enn regex-iterasjonen, mens
+# CPython er raskest når skanningen skjer i C (re.finditer).
+_PYPY = platform.python_implementation() == "PyPy"
+
+DELIM_RE = re.compile(r"[{}()]")
+
+
+def _build_pair_tables(text: str) -> Tuple[Dict[int, int], Dict[int, int]]:
+    # Klammer og parenteser i én finditer, med hver sin stakk: hver åpning
+    # peker på sin lukking. Gir samme par som å telle dybde fra hver åpning,
+    # men deles av alle oppslag.
+    braces: Dict[int, int] = {}
+    parens: Dict[int, int] = {}
+    brace_stack: List[int] = []
+    paren_stack: List[int] = []
+    for i in map(re.Match.start, DELIM_RE.finditer(text)):
+        ch = text[i]
+        if ch == "{":
+            brace_stack.append(i)
+        elif ch == "(":
+            paren_stack.append(i)
+        elif ch == "}":
+            if brace_stack:
+                braces[brace_stack.pop()] = i
+        elif paren_stack:
+            parens[paren_stack.pop()] = i
+    return braces, parens
+
+
+def _build_pair_tables_loop(text: str) -> Tuple[Dict[int, int], Dict[int, int]]:
+    # Samme resultat som _build_pair_tables, som ren tegnløkke for PyPy
+    braces: Dict[int, int] = {}
+    parens: Dict[int, int] = {}
+    brace_stack: List[int] = []
+    paren_stack: List[int] = []
+    for i, ch in enumerate(text):
+        if ch == "{":
+            brace_stack.append(i)
+        elif ch == "(":
+            paren_stack.append(i)
+        elif ch == "}":
+            if brace_stack:
+                braces[brace_stack.pop()] = i
+        elif ch == ")" and paren_stack:
+            parens[paren_stack.pop()] = i
+    return braces, parens
+
+
+class DsDocument:
+    """
+    Én .ds-tekst og det som avledes av den: linjeindeks, klamme- og
+    parentespar, seksjoner og blokker. Alt bygges første gang det trengs og
+    lever like lenge som dokumentet. Funksjonene får dokumentet som argument,
+    så ingenting caches på modulnivå, og flere dokumenter kan brukes om
+    hverandre.
+    """
+
+    def __init__(self, text: str) -> None:
+        self.text = text
+        # Resultater fra @per_document-funksjoner, med funksjonen som nøkkel
+        self.derived: Dict[Callable[..., Any], Any] = {}
+        # Par fra quoted_pairs_from (uten kommentarer) funnet så langt:
+        # åpning -> lukketegn
+        self.quoted_pairs: Dict[int, int] = {}
+
+    @cached_property
+    def newlines(self) -> List[int]:
+        return build_line_index(self.text)
+
+    @cached_property
+    def pairs(self) -> Tuple[Dict[int, int], Dict[int, int]]:
+        """
+        (klammer, parenteser): posisjon for hver '{' / '(' -> posisjonen til
+        tilhørende lukketegn. Begge bygges i én passering.
+        """
+        if _PYPY:
+            return _build_pair_tables_loop(self.text)
+        return _build_pair_tables(self.text)
+
+
+T = TypeVar("T")
+
+
+def per_document(func: Callable[[DsDocument], T]) -> Callable[[DsDocument], T]:
+    """Beregn func(doc) én gang per dokument og lagre resultatet på det."""
+
+    @wraps(func)
+    def wrapper(doc: DsDocument) -> T:
+        try:
+            return doc.derived[func]
+        except KeyError:
+            result = doc.derived[func] = func(doc)
+            return result
+
+    return wrapper
+
+
+def find_brace_bounds(doc: DsDocument, open_idx: int) -> Tuple[int, int]:
+    """
+    Returner (body_start_idx, body_end_idx) for {...}-blokken som starter i
+    `open_idx`. body_end_idx er indeksen til '}'-tegnet.
+    """
+    if doc.text[open_idx] != "{":
+        raise ValueError("Forventet '{' i posisjon %d" % open_idx)
+    close_idx = doc.pairs[0].get(open_idx)
+    if close_idx is None:
+        raise ValueError("Ubalanserte klammer fra posisjon %d" % open_idx)
+    return open_idx + 1, close_idx
+
+
+def find_paren_bounds(doc: DsDocument, open_idx: int) -> Tuple[int, int]:
+    """
+    Returner (body_start_idx, body_end_idx) for (...)-blokken som starter i
+    `open_idx`. body_end_idx er indeksen til ')'-tegnet.
+    """
+    if doc.text[open_idx] != "(":
+        raise ValueError("Forventet '(' i posisjon %d" % open_idx)
+    close_idx = doc.pairs[1].get(open_idx)
+    if close_idx is None:
+        raise ValueError("Ubalanserte parenteser fra posisjon %d" % open_idx)
+    return open_idx + 1, close_idx
+
+
+# Strengavslutning etter åpningsfnutten, inkl. escapede tegn og sluttfnutten
+STRING_TAIL_RE = {
+    '"': re.compile(r'[^"\\]*(?:\\.[^"\\]*)*"', re.S),
+    "'": re.compile(r"[^'\\]*(?:\\.[^'\\]*)*'", re.S),
+}
+
+# Tegn som kan endre tilstand under strengbevisst matching, per
+# (åpningstegn, kommentarer); alt annet hoppes over i C
+QUOTED_TOKEN_RES = {
+    ("{", False): re.compile(r"[{}\"']"),
+    ("(", False): re.compile(r"[()\"']"),
+    ("{", True): re.compile(r"[{}\"'/]"),
+    ("(", True): re.compile(r"[()\"'/]"),
+}
+
+
+def quoted_pairs_from(text: str, open_idx: int, comments: bool = False) -> Dict[int, int]:
+    """
+    Match '{' eller '(' i `open_idx` mot lukketegnet, og hopp over strenger
+    ('...' og "..." med escapes) og, med comments=True, // og /* */. Til
+    forskjell fra DsDocument.pairs starter skanningen i `open_idx`,
+    utenfor streng, så fnutter tidligere i teksten påvirker ikke resultatet.
+
+    Returnerer alle par av samme type som lukkes underveis, også det ytre
+    hvis blokken lukkes. En uavsluttet streng eller kommentar avslutter
+    skanningen, og da mangler de parene som ikke ble lukket.
+    """
+    open_ch = text[open_idx]
+    token_re = QUOTED_TOKEN_RES[open_ch, comments]
+    pairs: Dict[int, int] = {}
+    stack: List[int] = []
+    i = open_idx
+    while True:
+        m = token_re.search(text, i)
+        if not m:
+            return pairs
+        i = m.start()
+        ch = text[i]
+        if ch == '"' or ch == "'":
+            ms = STRING_TAIL_RE[ch].match(text, i + 1)
+            if not ms:
+                return pairs
+            i = ms.end()
+            continue
+        if ch == "/":
+            nxt = text[i + 1 : i + 2]
+            if nxt == "/":
+                i = text.find("\n", i + 2)
+                if i == -1:
+                    return pairs
+            elif nxt == "*":
+                i = text.find("*/", i + 2)
+                if i == -1:
+                    return pairs
+                i += 1
+        elif ch == open_ch:
+            stack.append(i)
+        elif stack:
+            pairs[stack.pop()] = i
+            if not stack:
+                return pairs
+        i += 1
+
+
+def iter_keyword_lines(text: str, keyword: str, start: int = 0, end: Optional[int] = None) -> Iterator[int]:
+    """
+    Finn linjer som bare består av `keyword` (pluss blanke) med str.find, og
+    returner posisjonen rett etter nøkkelordet. Tilsvarer
+    `^\\s*keyword\\s*$` med MULTILINE på `text[start:end]`, men uten
+    regex-skann av hele teksten. Som i en slice regnes `start` som starten
+    på en linje, så nøkkelordet kan stå rett etter en seksjons '{'.
+    """
+    if end is None:
+        end = len(text)
+    n = len(keyword)
+    i = text.find(keyword, start, end)
+    while i != -1:
+        nl = text.rfind("\n", start, i)
+        line_start = nl + 1 if nl != -1 else start
+        line_end = text.find("\n", i + n, end)
+        if line_end == -1:
+            line_end = end
+        if not text[line_start:i].strip() and not text[i + n : line_end].strip():
+            yield i + n
+        i = text.find(keyword, i + n, end)
+
+
+def finditer_span(
+    line_re: "re.Pattern[str]", at_re: "re.Pattern[str]", text: str, start: int, end: int
+) -> Iterator["re.Match[str]"]:
+    """
+    Som `line_re.finditer(text[start:end])`, men direkte i `text` og med
+    posisjoner i hele teksten. `line_re` er forankret med `^` (MULTILINE);
+    `at_re` er samme mønster uten `^`. Med pos treffer ikke `^` i `start`
+    med mindre forrige tegn er et linjeskift, mens den alltid treffer i
+    starten av en slice; derfor prøves `at_re` i `start` først. Mønsteret
+    må ikke kunne treffe en tom streng.
+    """
+    m = at_re.match(text, start, end)
+    if m is not None:
+        yield m
+        start = m.end()
+    yield from line_re.finditer(text, start, end)
+
+
+# Toppnivåseksjonene eksportørene leter etter
+TOP_SECTION_KEYWORDS = ("forms", "reports", "workflow")
+
+
+@per_document
+def find_top_sections(doc: DsDocument) -> Dict[str, Tuple[Tuple[int, int], ...]]:
+    """
+    Alle `keyword { ... }`-seksjoner for hvert nøkkelord i
+    TOP_SECTION_KEYWORDS, som (start_abs, end_abs) i dokumentrekkefølge.
+    Finnes én gang per dokument og deles av alle seksjonsoppslagene.
+
+    Nøkkelordene letes opp med str.find hver for seg; det er raskere enn én
+    felles regex med `^...$` over hele teksten.
+    """
+    text = doc.text
+    sections: Dict[str, Tuple[Tuple[int, int], ...]] = {}
+    for keyword in TOP_SECTION_KEYWORDS:
+        bounds: List[Tuple[int, int]] = []
+        for kw_end in iter_keyword_lines(text, keyword):
+            brace_idx = text.find("{", kw_end)
+            if brace_idx == -1:
+                continue
+            try:
+                bounds.append(find_brace_bounds(doc, brace_idx))
+            except ValueError:
+                continue
+        sections[keyword] = tuple(bounds)
+    return sections
+
+
+# Lookahead-en på første bokstav i rapporttypene avviser de fleste linjer
+# med ett tegnsett-oppslag, før alternasjonen prøves gren for gren.
+# Lengre typer står foran prefiksene sine (pivotchart før pivot).
+REPORT_HEADER_RE = re.compile(
+    r"^\s*(?=[dlspcthkm])"
+    r"(default\s+list|list|summary|pivotchart|pivot|chart|calendar|timeline|kanban|map|htmlview|tabular|matrix)"
+    r"\s+(\w+)",
+    re.MULTILINE,
+)
+
+
+class ReportBlock(NamedTuple):
+    """En rapportdefinisjon: navn, type og posisjonene i teksten."""
+
+    name: str
+    report_type: str
+    header_start: int  # start på headerlinjen (for start_line)
+    start: int  # første tegn etter '{'
+    end: int  # posisjonen til avsluttende '}'
+
+
+def find_reports_sections(doc: DsDocument) -> List[Tuple[int, int]]:
+    """
+    Finn alle `reports { ... }`-seksjoner og returner (start_abs, end_abs)
+    for hver.
+    """
+    return list(find_top_sections(doc)["reports"])
+
+
+@per_document
+def find_report_blocks(doc: DsDocument) -> Tuple[ReportBlock, ...]:
+    """
+    Alle rapportblokker i dokumentet, funnet én gang og delt av rapport- og
+    rapportfelt-eksporten. Ubalanserte rapportklammer gir ValueError.
+    """
+    text = doc.text
+    blocks: List[ReportBlock] = []
+    for body_start, body_end in find_reports_sections(doc):
+        # Seksjonen slices slik at `^` kan treffe rett etter '{', som før
+        body = text[body_start:body_end]
+        for m in REPORT_HEADER_RE.finditer(body):
+            header_abs_start = body_start + m.start()
+
+            # Finn '{' som starter selve rapportblokken
+            brace_idx_abs = text.find("{", header_abs_start, body_end)
+            if brace_idx_abs == -1:
+                continue
+
+            report_start, report_end = find_brace_bounds(doc, brace_idx_abs)
+            # Navn og type gjentas i hver post som eksporteres for rapporten
+            blocks.append(
+                ReportBlock(
+                    sys.intern(m.group(2)),
+                    sys.intern(m.group(1).strip()),
+                    header_abs_start,
+                    report_start,
+                    report_end,
+                )
+            )
+    return tuple(blocks)
+
+
+PAGE_HEADER_RE = re.compile(r"^\s*page\s+(\w+)", re.MULTILINE)
+
+
+class PageBlock(NamedTuple):
+    """En page-definisjon: navn og posisjonene i teksten."""
+
+    name: str
+    header_start: int  # start på headerlinjen (for start_line)
+    start: int  # første tegn etter '{'
+    end: int  # posisjonen til avsluttende '}'
+
+
+def find_pages_section(doc: DsDocument) -> Optional[Tuple[int, int]]:
+    """
+    (start_abs, end_abs) for den første `pages { ... }`-seksjonen, eller None
+    hvis den mangler eller ikke lukkes.
+    """
+    text = doc.text
+    kw_end = next(iter_keyword_lines(text, "pages"), None)
+    if kw_end is None:
+        return None
+    brace_idx = text.find("{", kw_end)
+    if brace_idx == -1:
+        return None
+    try:
+        return find_brace_bounds(doc, brace_idx)
+    except ValueError:
+        return None
+
+
+@per_document
+def find_page_blocks(doc: DsDocument) -> Tuple[PageBlock, ...]:
+    """
+    Alle page-blokker i pages-seksjonen, funnet én gang og delt av page- og
+    komponenteksporten. Ufullstendige page-blokker hoppes over.
+    """
+    section = find_pages_section(doc)
+    if section is None:
+        return ()
+
+    text = doc.text
+    pages_start, pages_end = section
+    blocks: List[PageBlock] = []
+    # Seksjonen slices slik at `^` kan treffe rett etter '{', som før
+    for m in PAGE_HEADER_RE.finditer(text[pages_start:pages_end]):
+        header_abs_start = pages_start + m.start()
+
+        brace_idx = text.find("{", header_abs_start, pages_end)
+        if brace_idx == -1:
+            continue
+        try:
+            page_start, page_end = find_brace_bounds(doc, brace_idx)
+        except ValueError:
+            continue
+        blocks.append(PageBlock(m.group(1), header_abs_start, page_start, page_end))
+    return tuple(blocks)
+
+
+def find_page_content(text: str, page_start: int, page_end: int) -> Optional[Tuple[int, int]]:
+    """
+    (start, slutt) for Content="..."-strengen i page-blokken, uten fnuttene,
+    eller None hvis blokken ikke har Content. Mangler sluttfnutten, går
+    strengen ut blokken.
+    """
+    idx = text.find('Content="', page_start, page_end)
+    if idx == -1:
+        return None
+    content_start = idx + 9
+    content_end = text.find('"', content_start, page_end)
+    if content_end == -1:
+        content_end = page_end
+    return content_start, content_end
@@ -17,18 +17,33 @@ Bruk:
 """
 
 from __future__ import annotations
+import os
 import sys
-import json
 import re
+from concurrent.futures import ProcessPoolExecutor
 from pathlib import Path
 
-VALUES_SET_RE = re.compile(r'(?mi)^\s*values\s*=\s*\{')
-VALUES_ANY_RE = re.compile(r'(?mi)^\s*values\s*=')
-LOOKUP_FORM_RE = re.compile(r'(?mi)^\s*values\s*=\s*([A-Za-z0-9_]+)\s*(?:\[.*\])?\s*\.\s*ID\b')
-FIELD_DISPLAY_RE = re.compile(r'(?mi)^\s*displayname\s*=\s*(".*?"|\'.*?\')')
+from ds_common import quoted_pairs_from, read_text, write_json
+
+# Alle feltattributter vi trenger (type, displayname, values) i ett regex, slik
+# at hver feltdefinisjon bare scannes én gang. values-grenen skiller mellom
+# verdisett (`values = {...}`) og oppslag (`values = Skjema[...].ID`).
+FIELD_ATTR_RE = re.compile(
+    r'(?mi)^[^\S\n]*(?:'
+    r'type\s*=\s*(?P<type>[A-Za-z0-9_]+)'
+    r'|displayname\s*=\s*(?P<display>".*?"|\'.*?\')'
+    r'|(?P<values>values)\s*=(?:\s*(?P<value_set>\{)'
+    r'|\s*(?P<lookup_form>[A-Za-z0-9_]+)\s*(?:\[.*\])?\s*\.\s*ID\b)?'
+    r')'
+)
+ACTIONS_BLOCK_RE = re.compile(r'(?mi)^\s*actions\s*\{')
+FORM_BLOCK_RE = re.compile(r'(?m)^\s*form\s+([A-Za-z0-9_]+)\s*\{')
+# Et felt er en linje uten '=' der neste tegn (etter blanke) er '('. Navnet kan
+# inneholde mellomrom, så det matches til linjeslutt og strippes etterpå.
+FIELD_HEADER_RE = re.compile(r'(?m)^[^\S\n]*(?P<name>[^\s=][^\n=]*)\n\s*\(')
 
 def strip_comments_keep_newlines(s: str) -> str:
-    out=[]; i=0
+    out: list[str] = []; i=0
     in_str=False; str_char=""
     in_line=False; in_block=False
     while i < len(s):
@@ -53,156 +68,155 @@ def strip_comments_keep_newlines(s: str) -> str:
         i+=1
     return "".join(out)
 
-def find_matching_brace(s: str, open_idx: int):
-    depth=0; i=open_idx
-    in_str=False; str_char=""
-    in_line=False; in_block=False
-    while i < len(s):
-        ch=s[i]; nxt=s[i+1] if i+1 < len(s) else ""
-        if in_line:
-            if ch=="\n": in_line=False
-        elif in_block:
-            if ch=="*" and nxt=="/": in_block=False; i+=1
-        elif in_str:
-            if ch=="\\": i+=1
-            elif ch==str_char: in_str=False; str_char=""
-        else:
-            if ch=="/" and nxt=="/": in_line=True; i+=1
-            elif ch=="/" and nxt=="*": in_block=True; i+=1
-            elif ch in ("'", '"'): in_str=True; str_char=ch
-            elif ch=="{": depth+=1
-            elif ch=="}":
-                depth-=1
-                if depth==0: return i
-        i+=1
-    return None
+# Strenger og kommentarer hoppes over, som i strip_comments_keep_newlines
+def find_matching_brace(s: str, open_idx: int) -> int | None:
+    return quoted_pairs_from(s, open_idx, comments=True).get(open_idx)
 
-def find_matching_paren(s: str, open_idx: int):
-    depth=0; i=open_idx
-    in_str=False; str_char=""
-    in_line=False; in_block=False
-    while i < len(s):
-        ch=s[i]; nxt=s[i+1] if i+1 < len(s) else ""
-        if in_line:
-            if ch=="\n": in_line=False
-        elif in_block:
-            if ch=="*" and nxt=="/": in_block=False; i+=1
-        elif in_str:
-            if ch=="\\": i+=1
-            elif ch==str_char: in_str=False; str_char=""
-        else:
-            if ch=="/" and nxt=="/": in_line=True; i+=1
-            elif ch=="/" and nxt=="*": in_block=True; i+=1
-            elif ch in ("'", '"'): in_str=True; str_char=ch
-            elif ch=="(":
-                depth+=1
-            elif ch==")":
-                depth-=1
-                if depth==0: return i
-        i+=1
-    return None
+def find_matching_paren(s: str, open_idx: int) -> int | None:
+    return quoted_pairs_from(s, open_idx, comments=True).get(open_idx)
 
 def remove_actions_blocks(form_block: str) -> str:
-    out=[]; i=0
+    out: list[str] = []; i=0
     while i < len(form_block):
-        m = re.search(r'(?mi)^\s*actions\s*\{', form_block[i:])
+        # Søk fra posisjon i direkte, uten å kopiere resten av blokken hver runde
+        m = ACTIONS_BLOCK_RE.search(form_block, i)
         if not m:
             out.append(form_block[i:]); break
-        start = i + m.start()
-        brace_idx = form_block.find("{", start)
+        start = m.start()
+        brace_idx = m.end()-1
         out.append(form_block[i:start])
         end = find_matching_brace(form_block, brace_idx)
         if end is None: break
         i = end + 1
     return "".join(out)
 
-def classify_field(raw_type: str, definition: str) -> str:
+def scan_field_attrs(definition: str) -> dict[str, str]:
+    """Første forekomst av hvert feltattributt, funnet i én passering."""
+    attrs: dict[str, str] = {}
+    for m in FIELD_ATTR_RE.finditer(definition):
+        for key in ("type", "display", "values", "value_set", "lookup_form"):
+            if key not in attrs and m.group(key) is not None:
+                attrs[key] = m.group(key)
+    return attrs
+
+def classify_field(raw_type: str | None, attrs: dict[str, str]) -> str:
     if not raw_type:
         return "unknown"
     t = raw_type.lower()
     if t == "picklist":
-        if VALUES_SET_RE.search(definition):
+        if "value_set" in attrs:
             return "picklist"
-        if VALUES_ANY_RE.search(definition):
+        if "values" in attrs:
             return "lookup"
         return "unknown"
     if t == "list":
-        if VALUES_SET_RE.search(definition):
+        if "value_set" in attrs:
             return "value_list"
-        if VALUES_ANY_RE.search(definition):
+        if "values" in attrs:
             return "lookup_list"
         return "unknown"
     return raw_type
 
-def extract_lookup_form(definition: str):
-    m = LOOKUP_FORM_RE.search(definition)
-    return m.group(1) if m else None
-
-def extract_field_displayname(definition: str):
-    m = FIELD_DISPLAY_RE.search(definition)
-    if not m: return None
-    v = m.group(1)
+def extract_field_displayname(attrs: dict[str, str]) -> str | None:
+    v = attrs.get("display")
+    if not v: return None
     return v[1:-1] if len(v)>=2 and v[0]==v[-1] else None
 
-def extract_flat(ds_text: str):
-    cleaned = strip_comments_keep_newlines(ds_text)
-    flat = []
-    for m in re.finditer(r'(?m)^\s*form\s+([A-Za-z0-9_]+)\s*\{', cleaned):
-        form_name = m.group(1)
-        start = m.start()
-        brace_idx = cleaned.find("{", m.end()-1)
-        end = find_matching_brace(cleaned, brace_idx)
-        if end is None:
+def parse_form_fields(cleaned: str, form_name: str, start: int, end: int) -> list[dict[str, str]]:
+    """Feltene i én form-blokk (cleaned[start:end+1]) som flate objekter."""
+    flat: list[dict[str, str]] = []
+    block = cleaned[start:end+1]
+    block_wo_actions = remove_actions_blocks(block)
+
+    pos=0
+    while True:
+        fm = FIELD_HEADER_RE.search(block_wo_actions, pos)
+        if not fm: break
+        field_name = fm.group("name").strip()
+        j = fm.end()-1
+        endp = find_matching_paren(block_wo_actions, j)
+        if endp is None:
+            pos = fm.end("name")+1; continue
+        definition = block_wo_actions[j:endp+1].rstrip()
+        pos = endp+1
+
+        attrs = scan_field_attrs(definition)
+        raw_type = attrs.get("type")
+        if raw_type and raw_type.lower() in {"section","submit","reset"}:
             continue
 
-        block = cleaned[start:end+1]
-        block_wo_actions = remove_actions_blocks(block)
+        field_type = sys.intern(classify_field(raw_type, attrs))
 
-        i=0
-        while i < len(block_wo_actions):
-            nl = block_wo_actions.find("\n", i)
-            if nl == -1: break
-            line = block_wo_actions[i:nl]; i = nl + 1
-            if not line.strip(): continue
-            if "=" in line: continue
+        obj = {
+            "form_name": form_name,
+            "field_name": field_name,
+            "field_type": field_type,
+            "definition": definition
+        }
 
-            field_name = line.strip()
-            j=i
-            while j < len(block_wo_actions) and block_wo_actions[j].isspace(): j+=1
+        fdn = extract_field_displayname(attrs)
+        if fdn:
+            obj["display_name"] = fdn
 
-            if j < len(block_wo_actions) and block_wo_actions[j]=="(":
-                endp = find_matching_paren(block_wo_actions, j)
-                if endp is None: continue
-                definition = block_wo_actions[j:endp+1].rstrip()
+        if field_type in {"lookup","lookup_list"}:
+            lf = attrs.get("lookup_form")
+            if lf:
+                obj["lookup_form"] = sys.intern(lf)
 
-                mt = re.search(r'(?mi)^\s*type\s*=\s*([A-Za-z0-9_]+)', definition)
-                raw_type = mt.group(1) if mt else None
-                if raw_type and raw_type.lower() in {"section","submit","reset"}:
-                    i=endp+1; continue
+        flat.append(obj)
 
-                field_type = classify_field(raw_type, definition)
+    return flat
 
-                obj = {
-                    "form_name": form_name,
-                    "field_name": field_name,
-                    "field_type": field_type,
-                    "definition": definition
-                }
+# Under denne størrelsen (tegn) koster oppstart av prosesser mer enn det gir
+PARALLEL_MIN_CHARS = 5 * 1024 * 1024
 
-                fdn = extract_field_displayname(definition)
-                if fdn:
-                    obj["display_name"] = fdn
+_worker_cleaned = ""
 
-                if field_type in {"lookup","lookup_list"}:
-                    lf = extract_lookup_form(definition)
-                    if lf:
-                        obj["lookup_form"] = lf
+def _init_worker(cleaned: str) -> None:
+    # Teksten sendes én gang per prosess, ikke én gang per form
+    global _worker_cleaned
+    _worker_cleaned = cleaned
 
-                flat.append(obj)
-                i=endp+1
+def _parse_form_span(span: tuple[str, int, int]) -> list[dict[str, str]]:
+    return parse_form_fields(_worker_cleaned, *span)
 
+def extract_flat(ds_text: str, parallel: bool = True) -> list[dict[str, str]]:
+    # Uten "form" finnes ingen form-blokker; hopp over kommentarfjerningen,
+    # som går tegn for tegn over hele teksten
+    if "form" not in ds_text:
+        return []
+    cleaned = strip_comments_keep_newlines(ds_text)
+    spans: list[tuple[str, int, int]] = []
+    for m in FORM_BLOCK_RE.finditer(cleaned):
+        # Samme form-navn, felttyper og oppslagsskjema går igjen i tusenvis av
+        # felter; intern gjør at de deler ett strengobjekt hver
+        form_name = sys.intern(m.group(1))
+        start = m.start()
+        brace_idx = m.end()-1
+        end = find_matching_brace(cleaned, brace_idx)
+        if end is None:
+            continue
+        spans.append((form_name, start, end))
+
+    flat: list[dict[str, str]] = []
+    workers = os.cpu_count() or 1
+    # parallel=False når kalleren selv kjører i en arbeidsprosess (run_all
+    # --jobs), så det ikke startes prosesser inni prosesser
+    if not parallel or len(cleaned) < PARALLEL_MIN_CHARS or len(spans) < 2 or workers < 2:
+        for span in spans:
+            flat.extend(parse_form_fields(cleaned, *span))
+        return flat
+
+    # Formene er uavhengige av hverandre; fordel dem på prosesser og slå
+    # sammen i opprinnelig rekkefølge
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker, initargs=(cleaned,)) as pool:
+        chunksize = max(1, len(spans) // (workers * 4))
+        for fields in pool.map(_parse_form_span, spans, chunksize=chunksize):
+            flat.extend(fields)
     return flat
 
+SUMMARY = "Skrev {n} felter til: {out}"
+
 def main() -> int:
     if len(sys.argv) != 3:
         print("Bruk: python extract_forms_fields_flat_v2.py input.ds output.json", file=sys.stderr)
@@ -211,11 +225,11 @@ def main() -> int:
     in_path = Path(sys.argv[1])
     out_path = Path(sys.argv[2])
 
-    ds_text = in_path.read_text(encoding="utf-8", errors="replace")
+    ds_text = read_text(in_path, errors="replace")
     data = extract_flat(ds_text)
 
-    out_path.write_text(json.dumps(data, indent=2, ensure_ascii=False), encoding="utf-8")
-    print(f"Skrev {len(data)} felter til: {out_path}")
+    write_json(out_path, data)
+    print(SUMMARY.format(n=len(data), out=out_path))
     return 0
 
 if __name__ == "__main__":
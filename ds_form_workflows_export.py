@@ -11,79 +11,44 @@ Da skrives en tom JSON-liste, og det rapporteres 0 workflows eksportert.
 """
 
 import re
-import json
 import argparse
 import os
+import sys
+from bisect import bisect_left
 from typing import List, Dict, Any, Tuple, Optional
 
+from ds_common import (
+    DsDocument,
+    char_to_line,
+    find_brace_bounds,
+    find_paren_bounds,
+    find_top_sections,
+    finditer_span,
+    iter_keyword_lines,
+    per_document,
+    read_text,
+    write_json,
+)
 
-def read_text(path: str) -> str:
-    with open(path, "r", encoding="utf-8") as f:
-        return f.read()
-
-
-def char_to_line(text: str, idx: int) -> int:
-    return text.count("\n", 0, idx) + 1
-
-
-def extract_brace_block(text: str, open_idx: int) -> Tuple[str, int, int]:
-    if text[open_idx] != "{":
-        raise ValueError("extract_brace_block: expected '{' at position %d" % open_idx)
-    depth = 0
-    for i in range(open_idx, len(text)):
-        ch = text[i]
-        if ch == "{":
-            depth += 1
-        elif ch == "}":
-            depth -= 1
-            if depth == 0:
-                return text[open_idx + 1 : i], open_idx + 1, i
-    raise ValueError("Unbalanced braces starting at %d" % open_idx)
-
-
-def extract_paren_block(text: str, open_idx: int) -> Tuple[str, int, int]:
-    if text[open_idx] != "(":
-        raise ValueError("extract_paren_block: expected '(' at position %d" % open_idx)
-    depth = 0
-    for i in range(open_idx, len(text)):
-        ch = text[i]
-        if ch == "(":
-            depth += 1
-        elif ch == ")":
-            depth -= 1
-            if depth == 0:
-                return text[open_idx + 1 : i], open_idx + 1, i
-    raise ValueError("Unbalanced parentheses starting at %d" % open_idx)
-
-
-def find_workflow_form_section(text: str) -> Optional[Tuple[str, int, int]]:
-    for m_wf in re.finditer(r"^\s*workflow\s*$", text, re.MULTILINE):
-        brace_idx = text.find("{", m_wf.end())
-        if brace_idx == -1:
-            continue
 
-        try:
-            wf_body, wf_start, wf_end = extract_brace_block(text, brace_idx)
-        except ValueError:
+# Finnes én gang per dokument, som seksjonene i ds_common
+@per_document
+def find_workflow_form_section(doc: DsDocument) -> Optional[Tuple[int, int]]:
+    text = doc.text
+    for wf_start, wf_end in find_top_sections(doc)["workflow"]:
+        form_kw_end = next(iter_keyword_lines(text, "form", wf_start, wf_end), None)
+        if form_kw_end is None:
             continue
 
-        m_form = re.search(r"^\s*form\s*$", wf_body, re.MULTILINE)
-        if not m_form:
+        form_open_abs = text.find("{", form_kw_end, wf_end)
+        if form_open_abs == -1:
             continue
 
-        brace_in_wf = wf_body.find("{", m_form.end())
-        if brace_in_wf == -1:
-            continue
-
-        form_open_abs = wf_start + brace_in_wf
-
         try:
-            form_body, form_start, form_end = extract_brace_block(text, form_open_abs)
+            return find_brace_bounds(doc, form_open_abs)
         except ValueError:
             continue
 
-        return form_body, form_start, form_end
-
     return None
 
 
@@ -92,83 +57,134 @@ HEADER_RE = re.compile(
     re.MULTILINE,
 )
 
-EVENT_HEADER_RE = re.compile(r"^\s*on\s+(.+?)\s*$", re.MULTILINE)
-
-
-def parse_form_workflows_with_code(text: str, source_file: str = "") -> List[Dict[str, Any]]:
-    section = find_workflow_form_section(text)
+EVENT_HEADER_PATTERN = r"\s*on\s+(.+?)\s*$"
+EVENT_HEADER_RE = re.compile("^" + EVENT_HEADER_PATTERN, re.MULTILINE)
+# Samme header rett etter workflow-blokkens '{' (se finditer_span)
+EVENT_HEADER_AT_RE = re.compile(EVENT_HEADER_PATTERN, re.MULTILINE)
+# `on user input of <felt>`; matches i starten av eventnavnet uten lower()
+USER_INPUT_RE = re.compile(r"user input of", re.IGNORECASE)
+
+TYPE_RE = re.compile(r"\btype\s*=\s*([^\n]+)")
+FORM_RE = re.compile(r"\bform\s*=\s*([^\n]+)")
+RECORD_EVENT_RE = re.compile(r"\brecord event\s*=\s*([^\n]+)")
+
+DELUGE_SCRIPT_RE = re.compile(r"custom deluge script")
+
+
+def parse_form_workflows_with_code(
+    text: str,
+    source_file: str = "",
+    *,
+    doc: Optional[DsDocument] = None,
+    include_source: str = "both",
+) -> List[Dict[str, Any]]:
+    """
+    `include_source` styrer hvilke kildetekster som tas med per workflow:
+    "body", "full", "both" eller "no". Posisjonene tas alltid med, så
+    teksten kan hentes fra .ds-filen ved behov.
+
+    `doc` er DsDocument for `text`, hvis kalleren allerede har ett.
+    """
+    if doc is None:
+        doc = DsDocument(text)
+
+    section = find_workflow_form_section(doc)
     if section is None:
         return []
 
-    form_body, form_start_abs, form_end_abs = section
+    newlines = doc.newlines
+
+    # Søking i workflow-blokkene skjer direkte i `text` med start/slutt-grenser,
+    # så blokkene kopieres bare ut når de faktisk skal med i resultatet.
+    # Seksjonen selv slices én gang: `^` i HEADER_RE skal kunne treffe rett
+    # etter '{', slik at start_line/full_source blir som før.
+    form_start_abs, form_end_abs = section
+    form_body = text[form_start_abs:form_end_abs]
     workflows: List[Dict[str, Any]] = []
+    source_name = os.path.basename(source_file) if source_file else ""
 
     for m in HEADER_RE.finditer(form_body):
         wf_name = m.group("name")
         display_name = m.group("display")
         header_abs_start = form_start_abs + m.start()
 
-        brace_idx_abs = text.find("{", header_abs_start)
-        if brace_idx_abs == -1 or brace_idx_abs > form_end_abs:
+        # Første '{' etter headeren. En header uten egen blokk får blokken til
+        # neste header, og neste header eksporteres fortsatt for seg.
+        brace_idx_abs = text.find("{", header_abs_start, form_end_abs)
+        if brace_idx_abs == -1:
             continue
 
         try:
-            wf_block_body, wf_block_start, wf_block_end = extract_brace_block(text, brace_idx_abs)
+            wf_block_start, wf_block_end = find_brace_bounds(doc, brace_idx_abs)
         except ValueError:
             continue
 
-        type_match = re.search(r"\btype\s*=\s*([^\n]+)", wf_block_body)
-        form_match = re.search(r"\bform\s*=\s*([^\n]+)", wf_block_body)
-        event_match = re.search(r"\brecord event\s*=\s*([^\n]+)", wf_block_body)
+        type_match = TYPE_RE.search(text, wf_block_start, wf_block_end)
+        form_match = FORM_RE.search(text, wf_block_start, wf_block_end)
+        event_match = RECORD_EVENT_RE.search(text, wf_block_start, wf_block_end)
 
-        wf_type = type_match.group(1).strip() if type_match else ""
-        form_name = form_match.group(1).strip() if form_match else ""
-        record_event = event_match.group(1).strip() if event_match else ""
+        # Samme type, skjema og eventnavn går igjen i mange workflows; intern
+        # gjør at de deler ett strengobjekt hver
+        wf_type = sys.intern(type_match.group(1).strip()) if type_match else ""
+        form_name = sys.intern(form_match.group(1).strip()) if form_match else ""
+        record_event = sys.intern(event_match.group(1).strip()) if event_match else ""
+
+        # Alle script-markører i workflowen, funnet i én passering. Hver event
+        # slår opp sine egne med binærsøk på startposisjonen.
+        script_hits = [
+            (d.start(), d.end())
+            for d in DELUGE_SCRIPT_RE.finditer(text, wf_block_start, wf_block_end)
+        ]
+        hit_starts = [h[0] for h in script_hits]
 
         events: List[Dict[str, Any]] = []
-        for ev in EVENT_HEADER_RE.finditer(wf_block_body):
+        for ev in finditer_span(EVENT_HEADER_RE, EVENT_HEADER_AT_RE, text, wf_block_start, wf_block_end):
             raw = ev.group(1).strip()
 
-            if raw.lower().startswith("user input of"):
-                parts = raw.split("of", 1)
-                event_type = "on " + parts[0].strip()
-                field = parts[1].strip() if len(parts) > 1 else None
+            if USER_INPUT_RE.match(raw):
+                head, sep, tail = raw.partition("of")
+                event_type = sys.intern("on " + head.strip())
+                field = tail.strip() if sep else None
             else:
-                event_type = "on " + raw
+                event_type = sys.intern("on " + raw)
                 field = None
 
-            ev_search_from = wf_block_start + ev.end()
-            brace_idx_abs_ev = text.find("{", ev_search_from, wf_block_end)
+            brace_idx_abs_ev = text.find("{", ev.end(), wf_block_end)
             if brace_idx_abs_ev == -1:
                 continue
 
             try:
-                ev_body, ev_body_start, ev_body_end = extract_brace_block(text, brace_idx_abs_ev)
+                ev_body_start, ev_body_end = find_brace_bounds(doc, brace_idx_abs_ev)
             except ValueError:
                 continue
 
             actions: List[Dict[str, Any]] = []
-            pos = 0
-            marker = "custom deluge script"
+            pos = ev_body_start
 
-            while True:
-                idx = ev_body.find(marker, pos)
-                if idx == -1:
+            for k in range(bisect_left(hit_starts, ev_body_start), len(script_hits)):
+                idx, marker_end = script_hits[k]
+                if marker_end > ev_body_end:
                     break
+                if idx < pos:
+                    # Ligger inni forrige script
+                    continue
 
-                open_paren = ev_body.find("(", idx)
+                open_paren = text.find("(", idx, ev_body_end)
                 if open_paren == -1:
                     break
 
                 try:
-                    script_body, p_start, p_end = extract_paren_block(ev_body, open_paren)
+                    p_start, p_end = find_paren_bounds(doc, open_paren)
                 except ValueError:
                     break
+                if p_end >= ev_body_end:
+                    # Ubalansert innenfor event-blokken
+                    break
 
                 actions.append(
                     {
                         "action_type": "custom_deluge_script",
-                        "script": script_body.strip(),
+                        "script": text[p_start:p_end].strip(),
                     }
                 )
                 pos = p_end + 1
@@ -181,44 +197,53 @@ def parse_form_workflows_with_code(text: str, source_file: str = "") -> List[Dic
                 }
             )
 
-        full_source = text[header_abs_start : wf_block_end + 1]
-
-        workflows.append(
-            {
-                "workflow_name": wf_name,
-                "display_name": display_name,
-                "type": wf_type,
-                "form_name": form_name,
-                "record_event": record_event,
-                "events": events,
-                "start_position": wf_block_start,
-                "end_position": wf_block_end,
-                "body": wf_block_body,
-                "full_source": full_source,
-                "source_file": os.path.basename(source_file) if source_file else "",
-                "start_line": char_to_line(text, header_abs_start),
-                "end_line": char_to_line(text, wf_block_end),
-            }
-        )
+        wf: Dict[str, Any] = {
+            "workflow_name": wf_name,
+            "display_name": display_name,
+            "type": wf_type,
+            "form_name": form_name,
+            "record_event": record_event,
+            "events": events,
+            "start_position": wf_block_start,
+            "end_position": wf_block_end,
+        }
+        if include_source in ("body", "both"):
+            wf["body"] = text[wf_block_start:wf_block_end]
+        if include_source in ("full", "both"):
+            wf["full_source"] = text[header_abs_start : wf_block_end + 1]
+        wf["source_file"] = source_name
+        wf["start_line"] = char_to_line(newlines, header_abs_start)
+        wf["end_line"] = char_to_line(newlines, wf_block_end)
+        workflows.append(wf)
 
     return workflows
 
 
+SUMMARY = "{n} form-workflows eksportert til {out}"
+
+
 def main() -> None:
     parser = argparse.ArgumentParser(
         description="Eksporter form-workflows fra .ds-fil til JSON (inkl. Deluge-kode)."
     )
     parser.add_argument("--file", required=True, help="Sti til .ds-filen")
     parser.add_argument("--out", default="form_workflows.json", help="Filnavn for resultat (default: form_workflows.json)")
+    parser.add_argument(
+        "--include-source",
+        choices=("no", "body", "full", "both"),
+        default="both",
+        help="Kildetekst per workflow: body, full_source, begge eller ingen (default: both)",
+    )
     args = parser.parse_args()
 
     text = read_text(args.file)
-    workflows = parse_form_workflows_with_code(text, source_file=args.file)
+    workflows = parse_form_workflows_with_code(
+        text, source_file=args.file, include_source=args.include_source
+    )
 
-    with open(args.out, "w", encoding="utf-8") as f:
-        json.dump(workflows, f, ensure_ascii=False, indent=2)
+    write_json(args.out, workflows)
 
-    print(f"{len(workflows)} form-workflows eksportert til {args.out}")
+    print(SUMMARY.format(n=len(workflows), out=args.out))
 
 
 if __name__ == "__main__":
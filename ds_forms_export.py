@@ -18,124 +18,120 @@ henter display_name/success_message/mode.
 """
 
 import re
-import json
 import argparse
 import os
-from typing import List, Dict, Any, Tuple
+from typing import List, Dict, Any, Optional, Tuple
 
+from ds_common import DsDocument, find_brace_bounds, find_top_sections, finditer_span, read_text, write_json
 
-def read_text(path: str) -> str:
-    with open(path, "r", encoding="utf-8") as f:
-        return f.read()
 
-
-def extract_brace_block(text: str, open_idx: int) -> Tuple[str, int, int]:
-    """
-    Returner (body, body_start_idx, body_end_idx) for en {...}-blokk.
-    body_end_idx er indeksen til '}'-tegnet (ikke inkludert i body).
-    """
-    if text[open_idx] != "{":
-        open_idx = text.find("{", open_idx)
-        if open_idx == -1:
-            raise ValueError("Fant ikke '{' fra angitt posisjon")
-    depth = 0
-    for i in range(open_idx, len(text)):
-        ch = text[i]
-        if ch == "{":
-            depth += 1
-        elif ch == "}":
-            depth -= 1
-            if depth == 0:
-                return text[open_idx + 1 : i], open_idx + 1, i
-    raise ValueError("Ubalanserte klammer fra posisjon %d" % open_idx)
-
-
-def find_forms_sections(text: str) -> List[Tuple[str, int, int]]:
+def find_forms_sections(doc: DsDocument) -> List[Tuple[int, int]]:
     """
     Finn alle `forms { ... }`-seksjoner og returner en liste med
-    (body, start_abs, end_abs) for hver.
+    (start_abs, end_abs) for hver.
     """
-    sections: List[Tuple[str, int, int]] = []
-    for m in re.finditer(r"^\s*forms\s*$", text, re.MULTILINE):
-        brace_idx = text.find("{", m.end())
-        if brace_idx == -1:
-            continue
-        try:
-            body, start, end = extract_brace_block(text, brace_idx)
-        except ValueError:
-            continue
-        sections.append((body, start, end))
-    return sections
+    return list(find_top_sections(doc)["forms"])
 
 
-FORM_HEADER_RE = re.compile(r"^\s*form\s+(\w+)", re.MULTILINE)
+# *_AT_RE er samme mønster uten `^`, for treff rett etter en '{' (se
+# finditer_span).
+FORM_HEADER_PATTERN = r"\s*form\s+(\w+)"
+FORM_HEADER_RE = re.compile("^" + FORM_HEADER_PATTERN, re.MULTILINE)
+FORM_HEADER_AT_RE = re.compile(FORM_HEADER_PATTERN, re.MULTILINE)
 
 # Heuristikk: første feltblokk ser typisk ut som:
 #   FeltNavn
 #   (
-FIRST_FIELD_BLOCK_RE = re.compile(r"^\s*[A-Za-z_]\w*\s*\n\s*\(", re.MULTILINE)
+FIRST_FIELD_BLOCK_PATTERN = r"\s*[A-Za-z_]\w*\s*\n\s*\("
+FIRST_FIELD_BLOCK_RE = re.compile("^" + FIRST_FIELD_BLOCK_PATTERN, re.MULTILINE)
+FIRST_FIELD_BLOCK_AT_RE = re.compile(FIRST_FIELD_BLOCK_PATTERN, re.MULTILINE)
+
+# Form-nivå metadata i header-segmentet
+DISPLAYNAME_RE = re.compile(r'\bdisplayname\s*=\s*"([^"]*)"', re.IGNORECASE)
+SUCCESS_MESSAGE_RE = re.compile(r'\bsuccess message\s*=\s*"([^"]*)"', re.IGNORECASE)
+STORE_DATA_RE = re.compile(r"\bstore data in zc\s*=\s*(true|false)\b", re.IGNORECASE)
 
 
-def header_segment(form_body: str) -> str:
+def header_segment(text: str, form_start: int, form_end: int) -> str:
     """
     Returner kun "headeren" (før første feltblokk) for å unngå at vi plukker opp
-    displayname fra felt/sections/print templates.
+    displayname fra felt/sections/print templates. Søket gjøres direkte i
+    `text`, så bare selve headeren kopieres ut.
     """
-    m = FIRST_FIELD_BLOCK_RE.search(form_body)
-    return form_body[: m.start()] if m else form_body
+    m = next(
+        finditer_span(FIRST_FIELD_BLOCK_RE, FIRST_FIELD_BLOCK_AT_RE, text, form_start, form_end),
+        None,
+    )
+    return text[form_start : m.start() if m else form_end]
 
 
-def parse_forms(text: str, source_file: str = "") -> List[Dict[str, Any]]:
+def parse_forms(
+    text: str, source_file: str = "", *, doc: Optional[DsDocument] = None
+) -> List[Dict[str, Any]]:
     """
     Parse alle form-definisjoner fra .ds-teksten.
     Hvis samme form finnes i flere `forms { ... }`-blokker, behold varianten med
     størst form-body (mest komplett definisjon).
+
+    `doc` er DsDocument for `text`, hvis kalleren allerede har ett.
     """
-    forms_by_name: Dict[str, Dict[str, Any]] = {}
+    if doc is None:
+        doc = DsDocument(text)
+
+    # Per form: (body-lengde, form_start, form_end). Metadata hentes først når
+    # vinneren er kjent, så overstyrte varianter aldri leses.
+    best_by_name: Dict[str, Tuple[int, int, int]] = {}
+    source_name = os.path.basename(source_file) if source_file else ""
 
-    for body, body_start, body_end in find_forms_sections(text):
-        for m in FORM_HEADER_RE.finditer(body):
+    for body_start, body_end in find_forms_sections(doc):
+        for m in finditer_span(FORM_HEADER_RE, FORM_HEADER_AT_RE, text, body_start, body_end):
             form_name = m.group(1)
 
-            # Finn '{' som starter selve form-blokken
-            header_abs_start = body_start + m.start()
-            brace_idx_abs = text.find("{", header_abs_start, body_end)
-            if brace_idx_abs == -1:
+            # Første '{' etter headeren. En header uten egen blokk får blokken
+            # til neste header, og neste header eksporteres fortsatt for seg.
+            brace_idx = text.find("{", m.start(), body_end)
+            if brace_idx == -1:
                 continue
 
-            form_body, form_start, form_end = extract_brace_block(text, brace_idx_abs)
+            form_start, form_end = find_brace_bounds(doc, brace_idx)
 
-            hdr = header_segment(form_body)
+            body_len = form_end - form_start
+            prev = best_by_name.get(form_name)
+            if prev is None or body_len > prev[0]:
+                best_by_name[form_name] = (body_len, form_start, form_end)
 
-            # Kun form-nivå metadata (i header-segmentet)
-            m_disp = re.search(r'(?i)\bdisplayname\s*=\s*"([^"]*)"', hdr)
-            display_name = m_disp.group(1) if m_disp else form_name
-
-            m_success = re.search(r'(?i)\bsuccess message\s*=\s*"([^"]*)"', hdr)
-            success_message = m_success.group(1) if m_success else ""
-
-            m_store = re.search(r'(?i)\bstore data in zc\s*=\s*(true|false)\b', hdr)
-            store_val = m_store.group(1).lower() if m_store else "true"
-            mode = "stateless" if store_val == "false" else "normal"
-
-            rec = {
-                "form_name": form_name,
-                "display_name": display_name,
-                "success_message": success_message,
-                "mode": mode,
-                "source_file": os.path.basename(source_file) if source_file else "",
-                "start_position": form_start,
-                "end_position": form_end,
-            }
-
-            prev = forms_by_name.get(form_name)
-            if prev is None or (rec["end_position"] - rec["start_position"]) > (prev["end_position"] - prev["start_position"]):
-                forms_by_name[form_name] = rec
+    forms_by_name: Dict[str, Dict[str, Any]] = {}
+    for form_name, (_, form_start, form_end) in best_by_name.items():
+        hdr = header_segment(text, form_start, form_end)
+
+        # Kun form-nivå metadata (i header-segmentet)
+        m_disp = DISPLAYNAME_RE.search(hdr)
+        display_name = m_disp.group(1) if m_disp else form_name
+
+        m_success = SUCCESS_MESSAGE_RE.search(hdr)
+        success_message = m_success.group(1) if m_success else ""
+
+        m_store = STORE_DATA_RE.search(hdr)
+        store_val = m_store.group(1).lower() if m_store else "true"
+        mode = "stateless" if store_val == "false" else "normal"
+
+        forms_by_name[form_name] = {
+            "form_name": form_name,
+            "display_name": display_name,
+            "success_message": success_message,
+            "mode": mode,
+            "source_file": source_name,
+            "start_position": form_start,
+            "end_position": form_end,
+        }
 
     # Returner stabil sortering for diff/lesbarhet
     return sorted(forms_by_name.values(), key=lambda x: x["form_name"].lower())
 
 
+SUMMARY = "{n} form(er) eksportert til {out}"
+
+
 def main() -> None:
     parser = argparse.ArgumentParser(
         description="Eksporter forms fra Zoho Creator .ds til JSON (minimalt sett + stateless/normal)."
@@ -147,10 +143,9 @@ def main() -> None:
     text = read_text(args.file)
     forms = parse_forms(text, source_file=args.file)
 
-    with open(args.out, "w", encoding="utf-8") as f:
-        json.dump(forms, f, ensure_ascii=False, indent=2)
+    write_json(args.out, forms)
 
-    print(f"{len(forms)} form(er) eksportert til {args.out}")
+    print(SUMMARY.format(n=len(forms), out=args.out))
 
 
 if __name__ == "__main__":
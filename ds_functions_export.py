@@ -22,10 +22,12 @@ i multiline-strengfelt.
 """
 
 import re
-import json
+import sys
 import argparse
 from typing import List, Tuple, Optional, Dict, Any
 
+from ds_common import DsDocument, char_to_line, find_brace_bounds, read_text, write_json
+
 
 # Gruppe 1 = returtype, gruppe 2 = fullt navn (ev. namespace + navn)
 HEADER_RE = re.compile(
@@ -33,12 +35,6 @@ HEADER_RE = re.compile(
 )
 
 
-def read_text(path: str) -> str:
-    """Les inn en tekstfil som UTF-8 (ignorerer feil)."""
-    with open(path, "r", encoding="utf-8", errors="ignore") as f:
-        return f.read()
-
-
 def split_name(full: str) -> Tuple[Optional[str], str]:
     """Splitt ev. namespace.fullname i (namespace, name)."""
     if "." in full:
@@ -47,49 +43,31 @@ def split_name(full: str) -> Tuple[Optional[str], str]:
     return None, full
 
 
-def char_to_line(text: str, idx: int) -> int:
-    """Konverter tegnindeks til linjenummer (1-basert)."""
-    return text.count("\n", 0, idx) + 1
-
-
-def extract_brace_block(text: str, open_idx: int) -> Tuple[str, int, int]:
-    """
-    Gitt indeks til en '{' i `text`, returner innholdet inni blokken,
-    samt start- og sluttindeks (eksklusiv slutt) for body.
-
-    Returnerer:
-    - body           : substring mellom '{' og '}'
-    - body_start_idx : indeks til første tegn etter '{'
-    - body_end_idx   : indeks til selve '}'-tegnet
-    """
-    if text[open_idx] != "{":
-        raise ValueError("extract_brace_block: expected '{' at position %d" % open_idx)
-    depth = 0
-    for i in range(open_idx, len(text)):
-        ch = text[i]
-        if ch == "{":
-            depth += 1
-        elif ch == "}":
-            depth -= 1
-            if depth == 0:
-                # i peker på '}' når depth går til 0
-                return text[open_idx + 1 : i], open_idx + 1, i
-    raise ValueError("Unbalanced braces starting at %d" % open_idx)
-
-
-def list_functions_with_code(text: str) -> List[Dict[str, Any]]:
+def list_functions_with_code(
+    text: str, *, doc: Optional[DsDocument] = None, include_source: str = "both"
+) -> List[Dict[str, Any]]:
     """
     Finn alle funksjoner i .ds-teksten og returner en liste med metadata + Deluge-kode.
+
+    `include_source` styrer om body og/eller full_source tas med ("body",
+    "full", "both" eller "no"); body_start/body_end er alltid med.
+    `doc` er DsDocument for `text`, hvis kalleren allerede har ett.
     """
     out: List[Dict[str, Any]] = []
+    if doc is None:
+        doc = DsDocument(text)
+    newlines = doc.newlines
 
     for m in HEADER_RE.finditer(text):
-        return_type = m.group(1)
+        # Returtypene og namespacene går igjen i mange funksjoner
+        return_type = sys.intern(m.group(1))
         full = m.group(2)
         ns, name = split_name(full)
+        if ns is not None:
+            ns = sys.intern(ns)
 
         header_idx = m.start()
-        header_line = char_to_line(text, header_idx)
+        header_line = char_to_line(newlines, header_idx)
 
         # Finn første '{' etter headeren (etter parametere)
         brace_idx = text.find("{", m.end())
@@ -98,31 +76,34 @@ def list_functions_with_code(text: str) -> List[Dict[str, Any]]:
             continue
 
         try:
-            body, body_start, body_end = extract_brace_block(text, brace_idx)
+            body_start, body_end = find_brace_bounds(doc, brace_idx)
         except ValueError:
             # Ubalanserte klammer – hopp over
             continue
 
-        full_source = text[header_idx : body_end + 1]
-
-        out.append(
-            {
-                "position": header_idx,
-                "namespace": ns,
-                "name": name,
-                "full_name": full,
-                "return_type": return_type,
-                "header_line": header_line,
-                "body_start": body_start,
-                "body_end": body_end,
-                "body": body,
-                "full_source": full_source,
-            }
-        )
+        func: Dict[str, Any] = {
+            "position": header_idx,
+            "namespace": ns,
+            "name": name,
+            "full_name": full,
+            "return_type": return_type,
+            "header_line": header_line,
+            "body_start": body_start,
+            "body_end": body_end,
+        }
+        # Tekstene slices bare ut når de faktisk skal med i resultatet
+        if include_source in ("body", "both"):
+            func["body"] = text[body_start:body_end]
+        if include_source in ("full", "both"):
+            func["full_source"] = text[header_idx : body_end + 1]
+        out.append(func)
 
     return out
 
 
+SUMMARY = "{n} funksjoner eksportert til {out}"
+
+
 def main() -> None:
     parser = argparse.ArgumentParser(
         description="Eksporter Deluge-funksjoner fra .ds-fil til JSON (inkl. funksjonskropp)."
@@ -137,15 +118,20 @@ def main() -> None:
         default="functions_with_code.json",
         help="Filnavn for resultat (default: functions_with_code.json)",
     )
+    parser.add_argument(
+        "--include-source",
+        choices=("no", "body", "full", "both"),
+        default="both",
+        help="Kildetekst per funksjon: body, full_source, begge eller ingen (default: both)",
+    )
     args = parser.parse_args()
 
-    text = read_text(args.file)
-    funcs = list_functions_with_code(text)
+    text = read_text(args.file, errors="ignore")
+    funcs = list_functions_with_code(text, include_source=args.include_source)
 
-    with open(args.out, "w", encoding="utf-8") as f:
-        json.dump(funcs, f, ensure_ascii=False, indent=2)
+    write_json(args.out, funcs)
 
-    print(f"{len(funcs)} funksjoner eksportert til {args.out}")
+    print(SUMMARY.format(n=len(funcs), out=args.out))
 
 
 if __name__ == "__main__":
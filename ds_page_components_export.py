@@ -11,84 +11,35 @@ page-blokker er ufullstendige. Da hoppes disse over, og scriptet fortsetter.
 """
 
 import re
-import json
 import argparse
 import os
-from typing import List, Dict, Any, Tuple, Optional
+import sys
+from functools import lru_cache
+from typing import Iterator, List, Dict, Any, Optional, Tuple
 
+from ds_common import DsDocument, find_page_blocks, find_page_content, read_text, write_json
 
-def read_text(path: str) -> str:
-    with open(path, "r", encoding="utf-8") as f:
-        return f.read()
 
+# Taggene som blir komponenter
+COMPONENT_TAGS = frozenset({"report", "form", "button", "chart", "image", "text"})
+# Alle tagger matches og filtreres etterpå: en annen tagg sluker attributtene
+# sine frem til '>', så f.eks. `<form ...>` inni en attributtverdi er ikke en
+# komponent
+TAG_RE = re.compile(r"<([A-Za-z]+)\b([^>]*)>")
+ATTR_RE = re.compile(r"([A-Za-z_]+)\s*=\s*'([^']*)'")
 
-def extract_brace_block(text: str, open_idx: int) -> Tuple[str, int, int]:
-    if text[open_idx] != "{":
-        open_idx = text.find("{", open_idx)
-        if open_idx == -1:
-            raise ValueError("Fant ikke '{' ved forventet posisjon")
-    depth = 0
-    for i in range(open_idx, len(text)):
-        ch = text[i]
-        if ch == "{":
-            depth += 1
-        elif ch == "}":
-            depth -= 1
-            if depth == 0:
-                return text[open_idx + 1 : i], open_idx + 1, i
-    raise ValueError("Ubalanserte klammer fra posisjon %d" % open_idx)
 
+# Attributter som gir tittel, i prioritert rekkefølge (lavest rang vinner)
+TITLE_KEY_RANK = {
+    key: rank
+    for rank, key in enumerate(["title", "displayName", "displayname", "text", "label", "name"])
+}
 
-def find_pages_section(text: str) -> Optional[Tuple[str, int, int]]:
-    m = re.search(r"^\s*pages\s*$", text, re.MULTILINE)
-    if not m:
-        return None
-
-    brace_idx = text.find("{", m.end())
-    if brace_idx == -1:
-        return None
-
-    try:
-        body, start, end = extract_brace_block(text, brace_idx)
-    except ValueError:
-        return None
-
-    return body, start, end
-
-
-PAGE_HEADER_RE = re.compile(r"^\s*page\s+(\w+)", re.MULTILINE)
-
-
-def parse_components_from_content(content: str) -> List[Dict[str, Any]]:
-    interesting_tags = {"report", "form", "button", "chart", "image", "text"}
-    components: List[Dict[str, Any]] = []
-
-    tag_re = re.compile(r"<([A-Za-z]+)\b([^>]*)>")
-    comp_id = 0
-
-    for m in tag_re.finditer(content):
-        tag = m.group(1)
-        attrs_raw = m.group(2) or ""
-
-        if tag not in interesting_tags:
-            continue
-
-        comp_id += 1
-        zml_snippet = m.group(0).strip()
-
-        attrs: Dict[str, str] = {}
-        for ma in re.finditer(r"([A-Za-z_]+)\s*=\s*'([^']*)'", attrs_raw):
-            attrs[ma.group(1)] = ma.group(2)
-
-        title = None
-        for key in ["title", "displayName", "displayname", "text", "label", "name"]:
-            if key in attrs:
-                title = attrs[key]
-                break
-
-        target_type = None
-        target_name = None
-        key_type_map = [
+# Attributter som peker på et mål: nøkkel -> (rang, måltype)
+TARGET_KEY_RANK = {
+    key: (rank, mapped_type)
+    for rank, (key, mapped_type) in enumerate(
+        [
             ("formLinkName", "form"),
             ("formName", "form"),
             ("viewLinkName", "report"),
@@ -98,70 +49,100 @@ def parse_components_from_content(content: str) -> List[Dict[str, Any]]:
             ("componentLinkName", "component"),
             ("linkName", "component"),
         ]
-        for key, mapped_type in key_type_map:
-            if key in attrs:
-                target_type = mapped_type
-                target_name = attrs[key]
-                break
-
-        components.append(
-            {
-                "component_id": comp_id,
-                "component_type": tag,
-                "title": title,
-                "target_type": target_type,
-                "target_name": target_name,
-                "layout_region": None,
-                "order": comp_id,
-                "zml": zml_snippet,
-            }
-        )
-
-    return components
-
-
-def parse_page_components(text: str, source_file: str = "") -> List[Dict[str, Any]]:
-    section = find_pages_section(text)
-    if section is None:
-        return []
-
-    pages_body, pages_start_abs, pages_end_abs = section
-    all_components: List[Dict[str, Any]] = []
-
-    for m in PAGE_HEADER_RE.finditer(pages_body):
-        page_name = m.group(1)
-        header_abs_start = pages_start_abs + m.start()
-
-        brace_idx_abs = text.find("{", header_abs_start, pages_end_abs)
-        if brace_idx_abs == -1:
+    )
+}
+
+
+@lru_cache(maxsize=16384)
+def _parse_attrs(attrs_raw: str) -> Tuple[Optional[str], Optional[str], Optional[str]]:
+    """
+    (title, target_type, target_name) for én attributtstreng. Like
+    komponenter går ofte igjen på tvers av pages, så resultatet caches per
+    streng.
+    """
+    # Tittel og mål plukkes ut i samme passering over attributtene, uten
+    # å bygge en dict først. `<=` gjør at siste forekomst av en nøkkel
+    # vinner, som når attributtene ble samlet i en dict.
+    title = None
+    title_rank = len(TITLE_KEY_RANK)
+    target_type = None
+    target_name = None
+    target_rank = len(TARGET_KEY_RANK)
+    for key, value in ATTR_RE.findall(attrs_raw):
+        rank = TITLE_KEY_RANK.get(key)
+        if rank is not None:
+            if rank <= title_rank:
+                title_rank = rank
+                title = value
             continue
+        target = TARGET_KEY_RANK.get(key)
+        if target is not None and target[0] <= target_rank:
+            target_rank, target_type = target
+            target_name = value
+    return title, target_type, target_name
+
+
+def parse_components_from_content(
+    content: str, page_name: str, source_name: str
+) -> Iterator[Dict[str, Any]]:
+    """
+    Komponentene i én pages Content-streng. page_name og source_file settes
+    rett i hver post, så postene slipper å kopieres etterpå. Postene gis
+    ut etter hvert, så det bygges ingen mellomliste per page.
+    """
+    comp_id = 0
 
-        try:
-            page_body, page_start, page_end = extract_brace_block(text, brace_idx_abs)
-        except ValueError:
+    for m in TAG_RE.finditer(content):
+        tag = m.group(1)
+        if tag not in COMPONENT_TAGS:
             continue
+        # Taggnavnet går igjen i de fleste postene; intern gir ett objekt per tagg
+        tag = sys.intern(tag)
+        attrs_raw = m.group(2) or ""
 
-        content_match = re.search(r'Content="', page_body)
-        if not content_match:
-            continue
+        comp_id += 1
+        zml_snippet = m.group(0).strip()
 
-        content_start = content_match.end()
-        content_end = page_body.find('"', content_start)
-        if content_end == -1:
-            content_end = len(page_body)
+        title, target_type, target_name = _parse_attrs(attrs_raw)
+
+        yield {
+            "component_id": comp_id,
+            "component_type": tag,
+            "title": title,
+            "target_type": target_type,
+            "target_name": target_name,
+            "layout_region": None,
+            "order": comp_id,
+            "zml": zml_snippet,
+            "page_name": page_name,
+            "source_file": source_name,
+        }
+
+
+def parse_page_components(
+    text: str, source_file: str = "", *, doc: Optional[DsDocument] = None
+) -> List[Dict[str, Any]]:
+    # doc: DsDocument for `text`, hvis kalleren allerede har ett
+    if doc is None:
+        doc = DsDocument(text)
+    all_components: List[Dict[str, Any]] = []
+    source_name = sys.intern(os.path.basename(source_file)) if source_file else ""
 
-        content_str = page_body[content_start:content_end]
-        components = parse_components_from_content(content_str)
+    for page_name, _, page_start, page_end in find_page_blocks(doc):
+        # Bare Content-strengen kopieres ut, ikke hele page-blokken
+        content = find_page_content(text, page_start, page_end)
+        if content is None:
+            continue
 
-        for comp in components:
-            comp_rec = dict(comp)
-            comp_rec["page_name"] = page_name
-            comp_rec["source_file"] = os.path.basename(source_file) if source_file else ""
-            all_components.append(comp_rec)
+        content_str = text[content[0]:content[1]]
+        all_components.extend(parse_components_from_content(content_str, page_name, source_name))
 
     return all_components
 
 
+SUMMARY = "{n} komponent(er) eksportert til {out}"
+
+
 def main() -> None:
     parser = argparse.ArgumentParser(
         description="Eksporter page-komponenter fra .ds-fil til JSON (flat liste)."
@@ -173,10 +154,9 @@ def main() -> None:
     text = read_text(args.file)
     components = parse_page_components(text, source_file=args.file)
 
-    with open(args.out, "w", encoding="utf-8") as f:
-        json.dump(components, f, ensure_ascii=False, indent=2)
+    write_json(args.out, components)
 
-    print(f"{len(components)} komponent(er) eksportert til {args.out}")
+    print(SUMMARY.format(n=len(components), out=args.out))
 
 
 if __name__ == "__main__":
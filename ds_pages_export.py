@@ -22,95 +22,43 @@ Da skrives en tom JSON-liste, og det rapporteres 0 pages eksportert.
 """
 
 import re
-import json
 import argparse
 import os
-from typing import List, Dict, Any, Tuple, Optional
+import sys
+from typing import List, Dict, Any, Optional
 
+from ds_common import DsDocument, char_to_line, find_page_blocks, find_page_content, read_text, write_json
 
-def read_text(path: str) -> str:
-    with open(path, "r", encoding="utf-8") as f:
-        return f.read()
 
+DISPLAYNAME_RE = re.compile(r'\bdisplayname\s*=\s*"([^"]*)"', re.IGNORECASE)
 
-def char_to_line(text: str, idx: int) -> int:
-    return text.count("\n", 0, idx) + 1
 
-
-def extract_brace_block(text: str, open_idx: int) -> Tuple[str, int, int]:
-    if text[open_idx] != "{":
-        open_idx = text.find("{", open_idx)
-        if open_idx == -1:
-            raise ValueError("Fant ikke '{' ved forventet posisjon")
-    depth = 0
-    for i in range(open_idx, len(text)):
-        ch = text[i]
-        if ch == "{":
-            depth += 1
-        elif ch == "}":
-            depth -= 1
-            if depth == 0:
-                return text[open_idx + 1 : i], open_idx + 1, i
-    raise ValueError("Ubalanserte klammer fra posisjon %d" % open_idx)
-
-
-def find_pages_section(text: str) -> Optional[Tuple[str, int, int]]:
-    m = re.search(r"^\s*pages\s*$", text, re.MULTILINE)
-    if not m:
-        return None
-
-    brace_idx = text.find("{", m.end())
-    if brace_idx == -1:
-        return None
-
-    try:
-        body, start, end = extract_brace_block(text, brace_idx)
-    except ValueError:
-        return None
-
-    return body, start, end
-
-
-PAGE_HEADER_RE = re.compile(r"^\s*page\s+(\w+)", re.MULTILINE)
-
-
-def parse_pages(text: str, source_file: str = "") -> List[Dict[str, Any]]:
-    section = find_pages_section(text)
-    if section is None:
+def parse_pages(
+    text: str, source_file: str = "", *, doc: Optional[DsDocument] = None
+) -> List[Dict[str, Any]]:
+    # doc: DsDocument for `text`, hvis kalleren allerede har ett
+    if doc is None:
+        doc = DsDocument(text)
+    blocks = find_page_blocks(doc)
+    if not blocks:
         return []
 
-    pages_body, pages_start_abs, pages_end_abs = section
-    pages: List[Dict[str, Any]] = []
-
-    for m in PAGE_HEADER_RE.finditer(pages_body):
-        page_name = m.group(1)
-        header_rel_start = m.start()
-        header_abs_start = pages_start_abs + header_rel_start
+    # Linjenummer slås opp med binærsøk i stedet for å telle linjeskift fra
+    # starten av filen for hver page
+    newlines = doc.newlines
 
-        brace_idx_abs = text.find("{", header_abs_start, pages_end_abs)
-        if brace_idx_abs == -1:
-            continue
-
-        try:
-            page_body, page_start, page_end = extract_brace_block(text, brace_idx_abs)
-        except ValueError:
-            continue
+    pages: List[Dict[str, Any]] = []
+    source_name = sys.intern(os.path.basename(source_file)) if source_file else ""
 
-        m_disp = re.search(r'(?i)\bdisplayname\s*=\s*"([^"]*)"', page_body)
+    for page_name, header_abs_start, page_start, page_end in blocks:
+        # Begge søkene går direkte i `text` innenfor page-blokken; verken
+        # blokken eller Content-strengen kopieres ut, bare lengden trengs
+        m_disp = DISPLAYNAME_RE.search(text, page_start, page_end)
         display_name = m_disp.group(1) if m_disp else ""
 
-        content_match = re.search(r'Content="', page_body)
-        if content_match:
-            content_start = content_match.end()
-            content_end = page_body.find('"', content_start)
-            if content_end == -1:
-                content_end = len(page_body)
-            content_str = page_body[content_start:content_end]
-            has_content = True
-            content_length = len(content_str)
-        else:
-            has_content = False
-            content_length = 0
+        content = find_page_content(text, page_start, page_end)
+        has_content = content is not None
+        content_length = content[1] - content[0] if content else 0
 
         pages.append(
             {
@@ -118,9 +66,9 @@ def parse_pages(text: str, source_file: str = "") -> List[Dict[str, Any]]:
                 "display_name": display_name,
                 "has_content": has_content,
                 "content_length": content_length,
-                "source_file": os.path.basename(source_file) if source_file else "",
-                "start_line": char_to_line(text, header_abs_start),
-                "end_line": char_to_line(text, page_end),
+                "source_file": source_name,
+                "start_line": char_to_line(newlines, header_abs_start),
+                "end_line": char_to_line(newlines, page_end),
                 "start_position": page_start,
                 "end_position": page_end,
             }
@@ -129,6 +77,9 @@ def parse_pages(text: str, source_file: str = "") -> List[Dict[str, Any]]:
     return pages
 
 
+SUMMARY = "{n} page(s) eksportert til {out}"
+
+
 def main() -> None:
     parser = argparse.ArgumentParser(
         description="Eksporter pages fra .ds-fil til JSON (kun page-metadata)."
@@ -140,10 +91,9 @@ def main() -> None:
     text = read_text(args.file)
     pages = parse_pages(text, source_file=args.file)
 
-    with open(args.out, "w", encoding="utf-8") as f:
-        json.dump(pages, f, ensure_ascii=False, indent=2)
+    write_json(args.out, pages)
 
-    print(f"{len(pages)} page(s) eksportert til {args.out}")
+    print(SUMMARY.format(n=len(pages), out=args.out))
 
 
 if __name__ == "__main__":
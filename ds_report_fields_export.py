@@ -21,167 +21,87 @@ feltene i videre analyser/visualisering i Zoho/KI.
 """
 
 import re
-import json
 import argparse
 import os
-from typing import List, Dict, Any, Tuple
+import sys
+from typing import List, Dict, Any, Optional
 
+from ds_common import DsDocument, char_to_line, find_paren_bounds, find_report_blocks, read_text, write_json
 
-def read_text(path: str) -> str:
-    """Les inn en tekstfil som UTF-8."""
-    with open(path, "r", encoding="utf-8") as f:
-        return f.read()
-
-
-def char_to_line(text: str, idx: int) -> int:
-    """Konverter tegnindeks til linjenummer (1-basert)."""
-    return text.count("\n", 0, idx) + 1
-
-
-def extract_brace_block(text: str, open_idx: int) -> Tuple[str, int, int]:
-    """
-    Gitt indeks til en '{' i `text`, returner innholdet inni blokken,
-    samt start- og sluttindeks (eksklusiv slutt) for body.
-
-    Returnerer (body, body_start_idx, body_end_idx) der:
-    - body           : substring mellom '{' og '}'
-    - body_start_idx : indeks til første tegn etter '{'
-    - body_end_idx   : indeks til selve '}'-tegnet
-    """
-    if text[open_idx] != "{":
-        raise ValueError("extract_brace_block: expected '{' at position %d" % open_idx)
-    depth = 0
-    for i in range(open_idx, len(text)):
-        ch = text[i]
-        if ch == "{":
-            depth += 1
-        elif ch == "}":
-            depth -= 1
-            if depth == 0:
-                return text[open_idx + 1 : i], open_idx + 1, i
-    raise ValueError("Unbalanced braces starting at %d" % open_idx)
-
-
-def extract_paren_block(text: str, open_idx: int) -> Tuple[str, int, int]:
-    """
-    Gitt indeks til en '(' i `text`, returner innholdet inni parentesblokken,
-    samt start- og sluttindeks (eksklusiv slutt). Håndterer nestede parenteser.
-    """
-    if text[open_idx] != "(":
-        raise ValueError("extract_paren_block: expected '(' at position %d" % open_idx)
-    depth = 0
-    for i in range(open_idx, len(text)):
-        ch = text[i]
-        if ch == "(":
-            depth += 1
-        elif ch == ")":
-            depth -= 1
-            if depth == 0:
-                return text[open_idx + 1 : i], open_idx + 1, i
-    raise ValueError("Unbalanced parentheses starting at %d" % open_idx)
-
-
-def find_reports_sections(text: str) -> List[Tuple[str, int, int]]:
-    """
-    Finn alle `reports { ... }`-seksjoner og returner en liste med
-    (body, start_abs, end_abs) for hver.
-    """
-    sections: List[Tuple[str, int, int]] = []
-    for m in re.finditer(r"^\s*reports\s*$", text, re.MULTILINE):
-        brace_idx = text.find("{", m.end())
-        if brace_idx == -1:
-            continue
-        try:
-            body, start, end = extract_brace_block(text, brace_idx)
-        except ValueError:
-            continue
-        sections.append((body, start, end))
-    return sections
-
-
-REPORT_HEADER_RE = re.compile(
-    r"^\s*(default\s+list|list|summary|pivotchart|pivot|chart|calendar|timeline|kanban|map|htmlview|tabular|matrix)\s+(\w+)",
-    re.MULTILINE,
-)
 
 # Feltlinje:   FeltNavn as "Visningsnavn"
 # eller:      FeltNavn
-FIELD_RE = re.compile(
-    r'^([A-Za-z0-9_.]+)(?:\s+as\s+"([^"]*)")?$'
+# Matches direkte i teksten innenfor rows-blokken (MULTILINE), så verken
+# blokken eller linjene kopieres ut. Gruppe 3 er '(' som starter en
+# konfig-blokk, hvis første ikke-blanke tegn etter feltlinjen er '(';
+# da klassifiseres linjen og konfig-åpningen i samme match.
+FIELD_LINE_PATTERN = (
+    r'[^\S\n]*([A-Za-z0-9_.]+)(?:[^\S\n]+as[^\S\n]+"([^"\n]*)")?[^\S\n]*$'
+    r"(?:\s*(\())?"
+)
+FIELD_LINE_RE = re.compile("^" + FIELD_LINE_PATTERN, re.MULTILINE)
+# Samme linje rett etter '(': der treffer ikke `^` når søket starter i pos
+FIELD_LINE_AT_RE = re.compile(FIELD_LINE_PATTERN, re.MULTILINE)
+
+# "show all rows from ..." eller "show rows from ...", til og med første
+# '(' etter skjemanavnet, som starter feltblokken
+SHOW_ROWS_RE = re.compile(
+    r"(?:show\s+all\s+rows\s+from\s+([A-Za-z0-9_]+)|show\s+rows\s+from\s+([A-Za-z0-9_]+))[^(]*\("
 )
 
 
 def parse_fields_from_rows_block(
-    text: str,
-    rows_body: str,
+    doc: DsDocument,
     rows_start_abs: int,
+    rows_end_abs: int,
     report_name: str,
-    source_file: str,
+    source_name: str,
 ) -> List[Dict[str, Any]]:
     """
     Parse alle feltlinjer inni `show ... rows from ... ( ... )`-blokken
-    og returner en liste med dicts for hvert felt.
+    og returner en liste med dicts for hvert felt. `source_name` er
+    filnavnet (uten mappe) som settes i hvert felt.
     """
+    text = doc.text
     fields: List[Dict[str, Any]] = []
-
-    # Vi vil både kunne finne linjenummer (globalt) og holde orden på rekkefølge.
-    lines = rows_body.splitlines(keepends=True)
-    cursor = 0  # posisjon inne i rows_body (0-basert)
-    idx = 0
+    pos = rows_start_abs
     order = 0
-
-    while idx < len(lines):
-        line = lines[idx]
-        line_stripped = line.strip()
-
-        line_abs_start = rows_start_abs + cursor
-
-        # Oppdater cursor for neste runde allerede nå
-        cursor += len(line)
-
-        # Hopp over tomme linjer og rene parentes-linjer
-        if not line_stripped or line_stripped in ("(", ")"):
-            idx += 1
-            continue
-
-        m_field = FIELD_RE.match(line_stripped)
+    # Feltene kommer i stigende rekkefølge, så linjenummeret telles videre
+    # fra forrige felt i stedet for å slås opp i hele linjeindeksen per felt
+    line_no = char_to_line(doc.newlines, rows_start_abs)
+    line_pos = rows_start_abs
+
+    while True:
+        m_field = None
+        if pos == rows_start_abs:
+            m_field = FIELD_LINE_AT_RE.match(text, pos, rows_end_abs)
+        if m_field is None:
+            m_field = FIELD_LINE_RE.search(text, pos, rows_end_abs)
         if not m_field:
-            idx += 1
-            continue
+            break
 
-        expr = m_field.group(1)
-        display_name = m_field.group(2) if m_field.group(2) is not None else None
+        expr, display_name, paren = m_field.groups()
+        pos = m_field.end() + 1
 
-        # Sjekk om neste linjer utgjør en konfig-blokk i parentes
+        # Konfig-blokk i parentes rett etter feltlinjen tas med til slutten
+        # av linjen der den lukkes.
         config = None
-        j = idx + 1
-
-        # Hopp over tomme linjer mellom header og eventuell '('
-        while j < len(lines) and lines[j].strip() == "":
-            cursor += len(lines[j])
-            j += 1
-
-        if j < len(lines) and lines[j].lstrip().startswith("("):
-            # Start på konfig-blokk
-            depth = 0
-            config_lines: List[str] = []
-            k = j
-            # Merk: siden cursor allerede er oppdatert frem til idx-linjen,
-            # justerer vi ikke cursor her (vi trenger ikke posisjon inni config).
-            while k < len(lines):
-                l2 = lines[k]
-                depth += l2.count("(")
-                depth -= l2.count(")")
-                config_lines.append(l2.rstrip("\n"))
-                k += 1
-                if depth <= 0 and "(" in "".join(config_lines):
-                    break
-            config = "\n".join(config_lines).strip()
-            idx = k
-        else:
-            idx += 1
+        if paren is not None:
+            paren_abs = m_field.start(3)
+            try:
+                _, close_abs = find_paren_bounds(doc, paren_abs)
+                line_end = text.find("\n", close_abs, rows_end_abs)
+            except ValueError:
+                line_end = -1
+            if line_end == -1:
+                line_end = rows_end_abs
+            config = text[paren_abs:line_end].strip()
+            pos = line_end + 1
 
         order += 1
+        field_start = m_field.start()
+        line_no += text.count("\n", line_pos, field_start)
+        line_pos = field_start
 
         fields.append(
             {
@@ -191,62 +111,57 @@ def parse_fields_from_rows_block(
                 "expression": expr,
                 "order": order,
                 "config": config,
-                "source_file": os.path.basename(source_file) if source_file else "",
-                "start_line": char_to_line(text, line_abs_start),
+                "source_file": source_name,
+                "start_line": line_no,
             }
         )
 
     return fields
 
 
-def parse_report_fields(text: str, source_file: str = "") -> List[Dict[str, Any]]:
+def parse_report_fields(
+    text: str, source_file: str = "", *, doc: Optional[DsDocument] = None
+) -> List[Dict[str, Any]]:
     """
     Parse alle rapporter og feltene deres fra .ds-teksten,
     og returner en flat liste med felt-dicts.
+    `doc` er DsDocument for `text`, hvis kalleren allerede har ett.
     """
-    all_fields: List[Dict[str, Any]] = []
-
-    for body, body_start, body_end in find_reports_sections(text):
-        for m in REPORT_HEADER_RE.finditer(body):
-            report_type = m.group(1).strip()
-            report_name = m.group(2)
-            header_abs_start = body_start + m.start()
-
-            # Finn '{' som starter selve rapportblokken
-            brace_idx_abs = text.find("{", header_abs_start, body_end)
-            if brace_idx_abs == -1:
-                continue
+    if doc is None:
+        doc = DsDocument(text)
+    blocks = find_report_blocks(doc)
+    if not blocks:
+        # Ingen rapporter: spar linjeindeksen over hele teksten
+        return []
 
-            report_body, report_start, report_end = extract_brace_block(text, brace_idx_abs)
+    all_fields: List[Dict[str, Any]] = []
+    # Samme filnavn i alle feltene; beregnes én gang, og intern gir ett
+    # delt strengobjekt
+    source_name = sys.intern(os.path.basename(source_file)) if source_file else ""
+
+    for report_name, report_type, header_abs_start, report_start, report_end in blocks:
+        # Finn "show all rows from ... (" eller "show rows from ... (" direkte
+        # i `text` innenfor rapportblokken; '(' starter feltblokken
+        m_rows = SHOW_ROWS_RE.search(text, report_start, report_end)
+        if not m_rows:
+            # F.eks. summary/pivot uten eksplisitt rows-definisjon – hopp over i denne runden
+            continue
 
-            # Finn "show all rows from ..." eller "show rows from ..."
-            m_rows = re.search(
-                r"show\s+all\s+rows\s+from\s+([A-Za-z0-9_]+)|show\s+rows\s+from\s+([A-Za-z0-9_]+)",
-                report_body,
-            )
-            if not m_rows:
-                # F.eks. summary/pivot uten eksplisitt rows-definisjon – hopp over i denne runden
-                continue
+        rows_start_abs, rows_end_abs = find_paren_bounds(doc, m_rows.end() - 1)
 
-            # Finn '(' etter matchen – dette er starten på feltblokken
-            rel_idx = m_rows.end()
-            open_paren_rel = report_body.find("(", rel_idx)
-            if open_paren_rel == -1:
-                continue
+        fields = parse_fields_from_rows_block(
+            doc=doc,
+            rows_start_abs=rows_start_abs,
+            rows_end_abs=rows_end_abs,
+            report_name=report_name,
+            source_name=source_name,
+        )
+        all_fields.extend(fields)
 
-            open_paren_abs = report_start + open_paren_rel
-            rows_body, rows_start_abs, rows_end_abs = extract_paren_block(text, open_paren_abs)
+    return all_fields
 
-            fields = parse_fields_from_rows_block(
-                text=text,
-                rows_body=rows_body,
-                rows_start_abs=rows_start_abs,
-                report_name=report_name,
-                source_file=source_file,
-            )
-            all_fields.extend(fields)
 
-    return all_fields
+SUMMARY = "{n} rapportfelt eksportert til {out}"
 
 
 def main() -> None:
@@ -268,10 +183,9 @@ def main() -> None:
     text = read_text(args.file)
     fields = parse_report_fields(text, source_file=args.file)
 
-    with open(args.out, "w", encoding="utf-8") as f:
-        json.dump(fields, f, ensure_ascii=False, indent=2)
+    write_json(args.out, fields)
 
-    print(f"{len(fields)} rapportfelt eksportert til {args.out}")
+    print(SUMMARY.format(n=len(fields), out=args.out))
 
 
 if __name__ == "__main__":
@@ -50,105 +50,79 @@ Per workflow eksporteres bl.a.:
 from __future__ import annotations
 
 import re
-import json
 import argparse
 import os
+import sys
+from functools import lru_cache
 from typing import List, Dict, Any, Tuple, Optional
 
+from ds_common import DsDocument, char_to_line, per_document, quoted_pairs_from, read_text, write_json
+
 
 HEADER_RE = re.compile(r'^\s*(?P<name>\w+)\s+as\s+"(?P<display>[^"]+)"\s*$', re.MULTILINE)
 EVENT_BLOCK_RE = re.compile(r'^\s*on\s+([A-Za-z ]+?)\s*$', re.MULTILINE)
-KEY_VALUE_RE_TEMPLATE = r'(?im)^\s*{key}\s*=\s*(.+?)\s*$'
-
-
-def read_text(path: str) -> str:
-    with open(path, 'r', encoding='utf-8') as f:
-        return f.read()
-
-
+# Samme header, men forankret i søkestart (der `^` ikke treffer med pos)
+EVENT_BLOCK_AT_RE = re.compile(r'\s*on\s+([A-Za-z ]+?)\s*$', re.MULTILINE)
+SCHEDULE_SECTION_RE = re.compile(r'^\s*schedule\s*$', re.MULTILINE)
 
-def char_to_line(text: str, idx: int) -> int:
-    return text.count('\n', 0, idx) + 1
 
+@lru_cache(maxsize=None)
+def section_re(section_name: str) -> re.Pattern[str]:
+    # Kompileres én gang per seksjonsnavn, ikke per kall
+    return re.compile(r'^\s*' + re.escape(section_name) + r'\s*$', re.MULTILINE)
 
 
-def extract_brace_block(text: str, open_idx: int) -> Tuple[str, int, int]:
-    if text[open_idx] != '{':
-        raise ValueError(f"Expected '{{' at position {open_idx}")
 
-    depth = 0
-    in_str = False
-    str_char = ''
-    escape = False
-
-    for i in range(open_idx, len(text)):
-        ch = text[i]
-
-        if in_str:
-            if escape:
-                escape = False
-            elif ch == '\\':
-                escape = True
-            elif ch == str_char:
-                in_str = False
-            continue
-
-        if ch in ('"', "'"):
-            in_str = True
-            str_char = ch
-            continue
+def _find_close(doc: DsDocument, open_idx: int) -> int:
+    # Strengbevisst matching fra ds_common. Returnerer -1 hvis blokken ikke
+    # lukkes.
+    #
+    # Alle indre par som passeres huskes i doc.quoted_pairs. Et søk fra en
+    # indre åpning starter i samme tilstand (utenfor streng) som det ytre
+    # søket var i der, så resultatet blir det samme, og nestede blokker
+    # slipper å skannes på nytt.
+    cached = doc.quoted_pairs.get(open_idx)
+    if cached is not None:
+        return cached
 
-        if ch == '{':
-            depth += 1
-        elif ch == '}':
-            depth -= 1
-            if depth == 0:
-                return text[open_idx + 1:i], open_idx + 1, i
+    pairs = quoted_pairs_from(doc.text, open_idx)
+    doc.quoted_pairs.update(pairs)
+    return pairs.get(open_idx, -1)
 
-    raise ValueError(f"Unbalanced braces starting at {open_idx}")
 
 
+def find_block_after(doc: DsDocument, from_idx: int, limit: int, open_ch: str) -> Optional[Tuple[int, int]]:
+    # Første `open_ch` i [from_idx, limit) og tilhørende lukketegn, som
+    # (første tegn i blokken, posisjon til lukketegnet). None hvis det ikke
+    # finnes noen åpning eller blokken ikke lukkes.
+    open_idx = doc.text.find(open_ch, from_idx, limit)
+    if open_idx == -1:
+        return None
+    close_idx = _find_close(doc, open_idx)
+    if close_idx == -1:
+        return None
+    return open_idx + 1, close_idx
 
-def extract_paren_block(text: str, open_idx: int) -> Tuple[str, int, int]:
-    if text[open_idx] != '(':
-        raise ValueError(f"Expected '(' at position {open_idx}")
-
-    depth = 0
-    in_str = False
-    str_char = ''
-    escape = False
-
-    for i in range(open_idx, len(text)):
-        ch = text[i]
 
-        if in_str:
-            if escape:
-                escape = False
-            elif ch == '\\':
-                escape = True
-            elif ch == str_char:
-                in_str = False
-            continue
 
-        if ch in ('"', "'"):
-            in_str = True
-            str_char = ch
-            continue
-
-        if ch == '(':
-            depth += 1
-        elif ch == ')':
-            depth -= 1
-            if depth == 0:
-                return text[open_idx + 1:i], open_idx + 1, i
+def extract_brace_block(doc: DsDocument, open_idx: int) -> Tuple[str, int, int]:
+    text = doc.text
+    if text[open_idx] != '{':
+        raise ValueError(f"Expected '{{' at position {open_idx}")
 
-    raise ValueError(f"Unbalanced parentheses starting at {open_idx}")
+    close_idx = _find_close(doc, open_idx)
+    if close_idx == -1:
+        raise ValueError(f"Unbalanced braces starting at {open_idx}")
+    return text[open_idx + 1:close_idx], open_idx + 1, close_idx
 
 
 
-def find_named_section(text: str, section_name: str, start_pos: int = 0) -> Optional[Tuple[str, int, int, int]]:
-    pattern = re.compile(r'^\s*' + re.escape(section_name) + r'\s*$', re.MULTILINE)
-    m = pattern.search(text, pos=start_pos)
+def find_named_section(doc: DsDocument, section_name: str, start_pos: int = 0) -> Optional[Tuple[str, int, int, int]]:
+    text = doc.text
+    # Billig sjekk i C før regex-søket over hele teksten
+    if section_name not in text:
+        return None
+    m = section_re(section_name).search(text, pos=start_pos)
     if not m:
         return None
 
@@ -157,7 +131,7 @@ def find_named_section(text: str, section_name: str, start_pos: int = 0) -> Opti
         return None
 
     try:
-        body, body_start, body_end = extract_brace_block(text, brace_idx)
+        body, body_start, body_end = extract_brace_block(doc, brace_idx)
     except ValueError:
         return None
 
@@ -165,13 +139,16 @@ def find_named_section(text: str, section_name: str, start_pos: int = 0) -> Opti
 
 
 
-def find_schedule_section(text: str) -> Optional[Tuple[str, int, int]]:
-    workflow_section = find_named_section(text, 'workflow')
+@per_document
+def find_schedule_section(doc: DsDocument) -> Optional[Tuple[str, int, int]]:
+    # Finnes én gang per dokument, så gjentatte kall på samme fil er gratis
+    text = doc.text
+    workflow_section = find_named_section(doc, 'workflow')
     if workflow_section is None:
         return None
 
     workflow_body, workflow_start, workflow_end, _ = workflow_section
-    schedule_match = re.search(r'^\s*schedule\s*$', workflow_body, re.MULTILINE)
+    schedule_match = SCHEDULE_SECTION_RE.search(workflow_body)
     if not schedule_match:
         return None
 
@@ -181,7 +158,7 @@ def find_schedule_section(text: str) -> Optional[Tuple[str, int, int]]:
         return None
 
     try:
-        schedule_body, schedule_start, schedule_end = extract_brace_block(text, brace_idx_abs)
+        schedule_body, schedule_start, schedule_end = extract_brace_block(doc, brace_idx_abs)
     except ValueError:
         return None
 
@@ -189,57 +166,88 @@ def find_schedule_section(text: str) -> Optional[Tuple[str, int, int]]:
 
 
 
-def extract_key_value(block_text: str, key: str) -> str:
-    pattern = re.compile(KEY_VALUE_RE_TEMPLATE.format(key=re.escape(key)))
-    m = pattern.search(block_text)
-    return m.group(1).strip() if m else ''
+def extract_key_values(block_text: str, keys: Tuple[str, ...]) -> Dict[str, str]:
+    # Én passering linje for linje med str.partition i stedet for ett
+    # regex-søk per nøkkel. Nøkkelen sammenlignes uten store/små bokstaver,
+    # og første linje med verdi vinner. Stopper når alle nøkler er funnet,
+    # som normalt er i toppen av blokken.
+    wanted = {key.lower(): key for key in keys}
+    found: Dict[str, str] = {}
+    pos = 0
+    n = len(block_text)
+    while pos < n and len(found) < len(wanted):
+        eol = block_text.find('\n', pos)
+        if eol == -1:
+            eol = n
+        key, sep, value = block_text[pos:eol].partition('=')
+        pos = eol + 1
+        if not sep:
+            continue
+        key = wanted.get(key.strip().lower())
+        if key is None or key in found:
+            continue
+        value = value.strip()
+        if value:
+            found[key] = value
+    return {key: found.get(key, '') for key in keys}
 
 
 
-def parse_actions(event_body: str) -> List[Dict[str, Any]]:
+def parse_actions(doc: DsDocument, body_start: int, body_end: int) -> List[Dict[str, Any]]:
+    # Søker direkte i teksten innenfor event-blokken i stedet for å slice ut
+    # resten av blokken for hvert søk. Et treff i selve søkestarten sjekkes
+    # først, siden `^` bare treffer der når den var starten på en slice.
+    text = doc.text
     actions: List[Dict[str, Any]] = []
-    pos = 0
+    pos = body_start
 
     while True:
-        m = re.search(r'^\s*on\s+([A-Za-z ]+?)\s*$', event_body[pos:], re.MULTILINE)
+        # Action-headere har samme form som event-headere (`on <navn>`)
+        m = EVENT_BLOCK_AT_RE.match(text, pos, body_end) or EVENT_BLOCK_RE.search(text, pos, body_end)
         if not m:
             break
 
         action_name = m.group(1).strip()
-        abs_rel_start = pos + m.start()
-        paren_idx = event_body.find('(', pos + m.end())
-        if paren_idx == -1:
-            pos = pos + m.end()
-            continue
-
-        try:
-            script_body, _, script_end = extract_paren_block(event_body, paren_idx)
-        except ValueError:
-            pos = pos + m.end()
+        script = find_block_after(doc, m.end(), body_end, '(')
+        if script is None or script[1] >= body_end:
+            pos = m.end()
             continue
 
+        script_start, script_end = script
         actions.append(
             {
-                'action_type': 'on ' + action_name,
-                'script': script_body.strip(),
+                'action_type': sys.intern('on ' + action_name),
+                'script': text[script_start:script_end].strip(),
             }
         )
 
         pos = script_end + 1
-        if pos <= abs_rel_start:
-            pos = abs_rel_start + 1
+        if pos <= m.start():
+            pos = m.start() + 1
 
     return actions
 
 
 
-def parse_schedule_workflows(text: str, source_file: str = '') -> List[Dict[str, Any]]:
-    section = find_schedule_section(text)
+def parse_schedule_workflows(
+    text: str,
+    source_file: str = '',
+    *,
+    doc: Optional[DsDocument] = None,
+    include_source: str = 'both',
+) -> List[Dict[str, Any]]:
+    # include_source: 'body', 'full', 'both' eller 'no' (posisjonene er alltid med).
+    # doc: DsDocument for `text`, hvis kalleren allerede har ett.
+    if doc is None:
+        doc = DsDocument(text)
+    section = find_schedule_section(doc)
     if section is None:
         return []
 
     schedule_body, schedule_start_abs, schedule_end_abs = section
     workflows: List[Dict[str, Any]] = []
+    newlines = doc.newlines
+    source_name = os.path.basename(source_file) if source_file else ''
 
     for m in HEADER_RE.finditer(schedule_body):
         wf_name = m.group('name')
@@ -251,75 +259,78 @@ def parse_schedule_workflows(text: str, source_file: str = '') -> List[Dict[str,
             continue
 
         try:
-            wf_block_body, wf_block_start, wf_block_end = extract_brace_block(text, brace_idx_abs)
+            wf_block_body, wf_block_start, wf_block_end = extract_brace_block(doc, brace_idx_abs)
         except ValueError:
             continue
 
-        wf_type = extract_key_value(wf_block_body, 'type')
-        form_name = extract_key_value(wf_block_body, 'form')
-        start_value = extract_key_value(wf_block_body, 'start')
-        time_zone = extract_key_value(wf_block_body, 'time zone')
+        settings = extract_key_values(wf_block_body, ('type', 'form', 'start', 'time zone'))
 
         events: List[Dict[str, Any]] = []
         for ev in EVENT_BLOCK_RE.finditer(wf_block_body):
             event_name = ev.group(1).strip()
-            ev_search_from_abs = wf_block_start + ev.end()
-            brace_idx_abs_ev = text.find('{', ev_search_from_abs, wf_block_end)
-            if brace_idx_abs_ev == -1:
-                continue
-
-            try:
-                ev_body, _, _ = extract_brace_block(text, brace_idx_abs_ev)
-            except ValueError:
+            ev_block = find_block_after(doc, wf_block_start + ev.end(), wf_block_end, '{')
+            if ev_block is None:
                 continue
 
             if event_name.lower() == 'load':
                 continue
 
-            actions = parse_actions(ev_body)
+            actions = parse_actions(doc, *ev_block)
             events.append(
                 {
-                    'event_type': 'on ' + event_name,
+                    'event_type': sys.intern('on ' + event_name),
                     'actions': actions,
                 }
             )
 
-        workflows.append(
-            {
-                'workflow_name': wf_name,
-                'display_name': display_name,
-                'type': wf_type,
-                'form_name': form_name,
-                'start': start_value,
-                'time_zone': time_zone.strip('"'),
-                'events': events,
-                'source_file': os.path.basename(source_file) if source_file else '',
-                'start_position': wf_block_start,
-                'end_position': wf_block_end,
-                'body': wf_block_body,
-                'full_source': text[header_abs_start:wf_block_end + 1],
-                'start_line': char_to_line(text, header_abs_start),
-                'end_line': char_to_line(text, wf_block_end),
-            }
-        )
+        wf: Dict[str, Any] = {
+            'workflow_name': wf_name,
+            'display_name': display_name,
+            # Type, skjema og eventnavn går igjen i mange workflows; intern
+            # gjør at de deler ett strengobjekt hver
+            'type': sys.intern(settings['type']),
+            'form_name': sys.intern(settings['form']),
+            'start': settings['start'],
+            'time_zone': settings['time zone'].strip('"'),
+            'events': events,
+            'source_file': source_name,
+            'start_position': wf_block_start,
+            'end_position': wf_block_end,
+        }
+        if include_source in ('body', 'both'):
+            wf['body'] = wf_block_body
+        if include_source in ('full', 'both'):
+            wf['full_source'] = text[header_abs_start:wf_block_end + 1]
+        wf['start_line'] = char_to_line(newlines, header_abs_start)
+        wf['end_line'] = char_to_line(newlines, wf_block_end)
+        workflows.append(wf)
 
     return workflows
 
 
 
+SUMMARY = '{n} schedule-workflow(s) eksportert til {out}'
+
+
+
 def main() -> None:
     parser = argparse.ArgumentParser(description='Eksporter schedule-workflows fra .ds-fil til JSON.')
     parser.add_argument('--file', required=True, help='Sti til .ds-filen')
     parser.add_argument('--out', default='schedule_workflows.json', help='Output JSON (default: schedule_workflows.json)')
+    parser.add_argument(
+        '--include-source',
+        choices=('no', 'body', 'full', 'both'),
+        default='both',
+        help='Kildetekst per workflow: body, full_source, begge eller ingen (default: both)',
+    )
     args = parser.parse_args()
 
     text = read_text(args.file)
-    workflows = parse_schedule_workflows(text, source_file=args.file)
+    workflows = parse_schedule_workflows(text, source_file=args.file, include_source=args.include_source)
 
-    with open(args.out, 'w', encoding='utf-8') as f:
-        json.dump(workflows, f, ensure_ascii=False, indent=2)
+    write_json(args.out, workflows)
 
-    print(f'{len(workflows)} schedule-workflow(s) eksportert til {args.out}')
+    print(SUMMARY.format(n=len(workflows), out=args.out))
 
 
 if __name__ == '__main__':
@@ -1,7 +1,13 @@
 import argparse
-import subprocess
-import sys
+import importlib
+import io
+from contextlib import redirect_stdout
+from concurrent.futures import Future, ProcessPoolExecutor, ThreadPoolExecutor
 from pathlib import Path
+from types import ModuleType
+from typing import Callable, Optional
+
+from ds_common import DsDocument, read_text, write_json
 
 
 OUTPUT_FILES = {
@@ -35,35 +41,195 @@ def find_default_ds_file(base_dir: Path) -> Path:
     )
 
 
-def build_command(script_name: str, script_path: Path, ds_file: Path, out_file: Path) -> list[str]:
-    if script_name == "ds_form_fields_export.py":
-        return [sys.executable, str(script_path), str(ds_file), str(out_file)]
+class DsInput:
+    """
+    .ds-filen som deles av eksportørene som kjøres i samme prosess. Filen
+    leses første gang den trengs, og bare én gang per feilmodus. Hver tekst
+    får ett DsDocument, så linjeindeks, klammepar og seksjoner også bygges
+    én gang og deles.
 
-    if script_name == "ds_report_workflows_export.py":
-        return [sys.executable, str(script_path), "--ds", str(ds_file), "--out", str(out_file)]
+    `parallel` sier om eksportørene selv kan fordele arbeid på prosesser;
+    det skal de ikke når de allerede kjører i en arbeidsprosess (--jobs).
+    """
 
-    return [sys.executable, str(script_path), "--file", str(ds_file), "--out", str(out_file)]
+    def __init__(self, path: Path, parallel: bool = True) -> None:
+        self.path = path
+        self.parallel = parallel
+        self._docs: dict[str, DsDocument] = {}
 
+    def doc(self, errors: str = "strict") -> DsDocument:
+        # Strengt dekodet tekst er lik uansett feilmodus, så den gjenbrukes
+        if "strict" in self._docs:
+            return self._docs["strict"]
+        if errors not in self._docs:
+            self._docs[errors] = DsDocument(read_text(str(self.path), errors=errors))
+        return self._docs[errors]
 
-def run_script(script_name: str, ds_file: Path, outdir: Path, base_dir: Path) -> bool:
-    script_path = base_dir / script_name
+    def text(self, errors: str = "strict") -> str:
+        return self.doc(errors).text
 
-    if not script_path.exists():
-        print(f"SKIPPET (finnes ikke): {script_name}")
-        return False
 
+def export_forms(module: ModuleType, ds: DsInput) -> list:
+    return module.parse_forms(ds.text(), source_file=str(ds.path), doc=ds.doc())
+
+
+def export_form_fields(module: ModuleType, ds: DsInput) -> list:
+    return module.extract_flat(ds.text(errors="replace"), parallel=ds.parallel)
+
+
+def export_form_workflows(module: ModuleType, ds: DsInput) -> list:
+    return module.parse_form_workflows_with_code(
+        ds.text(), source_file=str(ds.path), doc=ds.doc()
+    )
+
+
+def export_schedule_workflows(module: ModuleType, ds: DsInput) -> list:
+    return module.parse_schedule_workflows(
+        ds.text(), source_file=str(ds.path), doc=ds.doc()
+    )
+
+
+def export_functions(module: ModuleType, ds: DsInput) -> list:
+    return module.list_functions_with_code(
+        ds.text(errors="ignore"), doc=ds.doc(errors="ignore")
+    )
+
+
+def export_pages(module: ModuleType, ds: DsInput) -> list:
+    return module.parse_pages(ds.text(), source_file=str(ds.path), doc=ds.doc())
+
+
+def export_page_components(module: ModuleType, ds: DsInput) -> list:
+    return module.parse_page_components(ds.text(), source_file=str(ds.path), doc=ds.doc())
+
+
+def export_reports(module: ModuleType, ds: DsInput) -> list:
+    return module.parse_reports(ds.text(), source_file=str(ds.path), doc=ds.doc())
+
+
+def export_report_fields(module: ModuleType, ds: DsInput) -> list:
+    return module.parse_report_fields(
+        ds.text(), source_file=str(ds.path), doc=ds.doc()
+    )
+
+
+def export_report_workflows(module: ModuleType, ds: DsInput) -> list:
+    return module.export_workflow_definitions(ds.text(), doc=ds.doc())
+
+
+# Alle eksportørene kjøres i samme prosess og deler innlest tekst og
+# DsDocument, i stedet for at hvert script starter Python og leser filen selv.
+IN_PROCESS_EXPORTS: dict[str, Callable[[ModuleType, DsInput], list]] = {
+    "ds_forms_export.py": export_forms,
+    "ds_form_fields_export.py": export_form_fields,
+    "ds_form_workflows_export.py": export_form_workflows,
+    "ds_schedule_workflows_export.py": export_schedule_workflows,
+    "ds_functions_export.py": export_functions,
+    "ds_pages_export.py": export_pages,
+    "ds_page_components_export.py": export_page_components,
+    "ds_reports_export.py": export_reports,
+    "ds_report_fields_export.py": export_report_fields,
+    "ds_report_workflows_export.py": export_report_workflows,
+}
+
+
+def export_in_process(script_name: str, ds: DsInput, outdir: Path) -> Optional[tuple[str, list]]:
+    # Parser uten å skrive: (eksportørens SUMMARY, data), eller None hvis
+    # eksportøren mangler eller feiler
     out_file = outdir / OUTPUT_FILES[script_name]
+
+    try:
+        module = importlib.import_module(Path(script_name).stem)
+    except ImportError:
+        print(f"SKIPPET (finnes ikke): {script_name}")
+        return None
+
     print(f"Kjorer: {script_name} -> {out_file}")
 
-    cmd = build_command(script_name, script_path, ds_file, out_file)
+    try:
+        return module.SUMMARY, IN_PROCESS_EXPORTS[script_name](module, ds)
+    except Exception as e:
+        print(f"FEIL i {script_name}: {e}")
+        return None
+
+
+def print_summary(script_name: str, outdir: Path, summary: str, data: list) -> None:
+    # Samme melding som eksportøren skriver når den kjøres som eget script
+    print(summary.format(n=len(data), out=outdir / OUTPUT_FILES[script_name]))
+
+
+def run_in_process(script_name: str, ds: DsInput, outdir: Path) -> bool:
+    exported = export_in_process(script_name, ds, outdir)
+    if exported is None:
+        return False
+    summary, data = exported
 
     try:
-        subprocess.run(cmd, check=True)
-        return True
-    except subprocess.CalledProcessError as e:
+        write_json(str(outdir / OUTPUT_FILES[script_name]), data)
+    except Exception as e:
         print(f"FEIL i {script_name}: {e}")
         return False
 
+    print_summary(script_name, outdir, summary, data)
+    return True
+
+
+def run_all_in_process(scripts: list[str], ds: DsInput, outdir: Path) -> list[bool]:
+    """
+    Kjør eksportørene etter tur i denne prosessen. JSON-filene skrives i
+    tråder mens neste eksportør parser, så skriving til disk overlapper med
+    parsingen i stedet for å komme i tillegg.
+
+    Oppsummeringen for hver eksportør skrives rett etter at den har kjørt,
+    som når scriptene kjøres hver for seg. Feiler en skriving i bakgrunnen,
+    meldes det etter at alle eksportørene har kjørt.
+    """
+    pending: list[tuple[str, Optional[Future]]] = []
+    with ThreadPoolExecutor(max_workers=4) as writer:
+        for script_name in scripts:
+            exported = export_in_process(script_name, ds, outdir)
+            if exported is None:
+                pending.append((script_name, None))
+                continue
+            summary, data = exported
+            out_file = outdir / OUTPUT_FILES[script_name]
+            pending.append((script_name, writer.submit(write_json, str(out_file), data)))
+            print_summary(script_name, outdir, summary, data)
+
+        results: list[bool] = []
+        for script_name, written in pending:
+            if written is None:
+                results.append(False)
+                continue
+            try:
+                written.result()
+            except Exception as e:
+                print(f"FEIL i {script_name}: {e}")
+                results.append(False)
+                continue
+            results.append(True)
+        return results
+
+
+# DsInput for prosessen når eksportørene kjøres parallelt (--jobs). Hver
+# arbeidsprosess leser .ds-filen selv, én gang, i stedet for å få hele
+# teksten sendt over for hver jobb.
+_worker_ds: Optional[DsInput] = None
+
+
+def _init_worker(ds_file: Path) -> None:
+    global _worker_ds
+    _worker_ds = DsInput(ds_file, parallel=False)
+
+
+def _run_in_worker(script_name: str, outdir: Path) -> tuple[bool, str]:
+    # Meldingene samles og skrives ut av hovedprosessen i vanlig rekkefølge,
+    # så utskriften blir den samme som uten --jobs
+    output = io.StringIO()
+    with redirect_stdout(output):
+        ok = run_in_process(script_name, _worker_ds, outdir)
+    return ok, output.getvalue()
+
 
 def main() -> None:
     base_dir = Path(__file__).resolve().parent
@@ -77,6 +243,12 @@ def main() -> None:
         "--outdir",
         help="Output-mappe. Standard er exports i samme mappe som run_all_exports.py.",
     )
+    parser.add_argument(
+        "--jobs",
+        type=int,
+        default=1,
+        help="Antall eksportører som kjøres samtidig i egne prosesser (default: 1, etter tur).",
+    )
     args = parser.parse_args()
 
     ds_file = Path(args.ds).resolve() if args.ds else find_default_ds_file(base_dir)
@@ -103,8 +275,23 @@ def main() -> None:
     print(f"DS-fil: {ds_file}")
     print(f"Output-mappe: {outdir}")
 
-    for script_name in scripts:
-        if run_script(script_name, ds_file, outdir, base_dir):
+    if args.jobs > 1:
+        # Eksportørene er uavhengige av hverandre og bruker bare CPU, så de
+        # fordeles på prosesser (GIL). Resultatene telles i vanlig rekkefølge.
+        with ProcessPoolExecutor(
+            max_workers=min(args.jobs, len(scripts)),
+            initializer=_init_worker,
+            initargs=(ds_file,),
+        ) as pool:
+            results = []
+            for success, output in pool.map(_run_in_worker, scripts, [outdir] * len(scripts)):
+                print(output, end="")
+                results.append(success)
+    else:
+        results = run_all_in_process(scripts, DsInput(ds_file), outdir)
+
+    for success in results:
+        if success:
             ok += 1
         else:
             failed += 1
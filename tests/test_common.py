@@ -0,0 +1,93 @@
+import random
+import unittest
+
+from ds_common import (
+    DsDocument,
+    _build_pair_tables,
+    _build_pair_tables_loop,
+    find_brace_bounds,
+    find_top_sections,
+    iter_keyword_lines,
+    quoted_pairs_from,
+)
+
+
+class IterKeywordLinesTest(unittest.TestCase):
+    def test_keyword_alone_on_line(self):
+        text = "a\n  forms  \nb\n"
+        self.assertEqual(list(iter_keyword_lines(text, "forms")), [text.index("forms") + 5])
+
+    def test_keyword_must_be_alone(self):
+        self.assertEqual(list(iter_keyword_lines("x forms\nformsy\nmyforms\n", "forms")), [])
+
+    def test_start_counts_as_line_start(self):
+        # Som `^\s*form\s*$` på text[start:end]: rett etter '{' er en linjestart
+        text = "workflow\n{ form\n {\n }\n}"
+        start = text.index("{") + 1
+        self.assertEqual(list(iter_keyword_lines(text, "form", start)), [text.index("form\n") + 4])
+        # ... men ikke uten start, der '{' står foran på samme linje
+        self.assertEqual(list(iter_keyword_lines(text, "form")), [])
+
+
+class QuotedPairsFromTest(unittest.TestCase):
+    def test_skips_delimiters_in_strings(self):
+        text = 'x { a = "}"; b = \'{\'; c = "\\"}" }'
+        self.assertEqual(quoted_pairs_from(text, 2), {2: len(text) - 1})
+
+    def test_returns_inner_pairs(self):
+        text = "(a (b) (c (d)))"
+        self.assertEqual(quoted_pairs_from(text, 0), {3: 5, 10: 12, 7: 13, 0: 14})
+
+    def test_comments_only_when_requested(self):
+        text = "{ // }\n}"
+        self.assertEqual(quoted_pairs_from(text, 0), {0: 5})
+        self.assertEqual(quoted_pairs_from(text, 0, comments=True), {0: 7})
+        text = "{ /* } */ }"
+        self.assertEqual(quoted_pairs_from(text, 0, comments=True), {0: 10})
+
+    def test_starts_outside_string(self):
+        # En fnutt før åpningen påvirker ikke matchingen
+        text = "don't { x }"
+        self.assertEqual(quoted_pairs_from(text, 6), {6: 10})
+
+    def test_unterminated_string_leaves_block_open(self):
+        self.assertEqual(quoted_pairs_from('{ "abc }', 0), {})
+
+
+class PairTablesTest(unittest.TestCase):
+    def test_pairs(self):
+        text = "a { b ( c { } ) ( ) }"
+        self.assertEqual(_build_pair_tables(text), ({10: 12, 2: 20}, {6: 14, 16: 18}))
+
+    def test_unbalanced(self):
+        # Lukketegn uten åpning ignoreres; åpninger uten lukking får ingen par
+        self.assertEqual(_build_pair_tables("} ) { ( ( )"), ({}, {8: 10}))
+
+    def test_variants_agree(self):
+        # Regex- og løkkevarianten (PyPy) må gi de samme tabellene
+        cases = ["", "{", "}", "()", "{(})", ")(", "x\n{ a(b) { \"}\" } }"]
+        rng = random.Random(0)
+        for _ in range(500):
+            cases.append("".join(rng.choice("{}()ab\n") for _ in range(rng.randrange(40))))
+        for text in cases:
+            self.assertEqual(_build_pair_tables(text), _build_pair_tables_loop(text), text)
+
+
+class DsDocumentTest(unittest.TestCase):
+    def test_derived_data_is_per_document(self):
+        a = DsDocument("forms\n{\n}\n")
+        b = DsDocument("x\nforms\n{ }\n")
+        self.assertEqual(find_top_sections(a)["forms"], ((7, 8),))
+        self.assertEqual(find_top_sections(b)["forms"], ((9, 10),))
+        # Andre kall på samme dokument gjenbruker resultatet
+        self.assertIs(find_top_sections(a), find_top_sections(a))
+
+    def test_bounds_use_document_pairs(self):
+        doc = DsDocument("{ ( ) }")
+        self.assertEqual(find_brace_bounds(doc, 0), (1, 6))
+        with self.assertRaises(ValueError):
+            find_brace_bounds(doc, 2)
+
+
+if __name__ == "__main__":
+    unittest.main()
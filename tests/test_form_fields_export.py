@@ -0,0 +1,45 @@
+import unittest
+from unittest import mock
+
+import ds_form_fields_export as ff
+import run_all_exports
+
+
+TEXT = """forms
+{
+    form A
+    {
+        Navn
+        (
+            type = text
+        )
+    }
+    form B
+    {
+        Tall
+        (
+            type = number
+        )
+    }
+}
+"""
+
+
+class ExtractFlatParallelTest(unittest.TestCase):
+    def test_parallel_false_never_starts_processes(self):
+        # Terskel og CPU-antall satt slik at parallell kjøring ellers velges
+        with mock.patch.object(ff, "PARALLEL_MIN_CHARS", 0), \
+                mock.patch.object(ff.os, "cpu_count", return_value=4), \
+                mock.patch.object(ff, "ProcessPoolExecutor", side_effect=AssertionError("pool")):
+            fields = ff.extract_flat(TEXT, parallel=False)
+        self.assertEqual([(f["form_name"], f["field_name"]) for f in fields], [("A", "Navn"), ("B", "Tall")])
+
+    def test_run_all_workers_export_sequentially(self):
+        with mock.patch.object(run_all_exports, "_worker_ds", None):
+            run_all_exports._init_worker("x.ds")
+            self.assertFalse(run_all_exports._worker_ds.parallel)
+        self.assertTrue(run_all_exports.DsInput("x.ds").parallel)
+
+
+if __name__ == "__main__":
+    unittest.main()
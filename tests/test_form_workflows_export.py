@@ -0,0 +1,38 @@
+import unittest
+
+from ds_form_workflows_export import parse_form_workflows_with_code
+
+
+def workflow_section(body: str) -> str:
+    return "workflow\n{\n form\n {\n" + body + "\n }\n}\n"
+
+
+class ParseFormWorkflowsTest(unittest.TestCase):
+    def test_event_right_after_workflow_brace(self):
+        # `on add` på samme linje som workflow-blokkens '{'
+        text = workflow_section(
+            '  W1 as "Wf"\n  {on add\n {\n actions\n {\n custom deluge script\n (\n x = 1;\n )\n }\n }\n }'
+        )
+        [wf] = parse_form_workflows_with_code(text)
+        self.assertEqual(
+            [(ev["event_type"], len(ev["actions"])) for ev in wf["events"]],
+            [("on add", 1)],
+        )
+        self.assertEqual(wf["events"][0]["actions"][0]["script"], "x = 1;")
+
+    def test_header_without_own_block_keeps_next_header(self):
+        # W0 har ingen blokk og får W1 sin; W1 skal likevel eksporteres
+        text = workflow_section('  W0 as "Zero"\n W1 as "Wf"\n {\n type = form\n }')
+        workflows = parse_form_workflows_with_code(text)
+        self.assertEqual([wf["workflow_name"] for wf in workflows], ["W0", "W1"])
+        self.assertEqual([wf["type"] for wf in workflows], ["form", "form"])
+
+    def test_form_keyword_right_after_workflow_brace(self):
+        # `form` på samme linje som workflow-seksjonens '{'
+        text = 'workflow\n{ form\n {\n  W1 as "Wf"\n  {\n type = form\n }\n }\n}\n'
+        workflows = parse_form_workflows_with_code(text)
+        self.assertEqual([wf["workflow_name"] for wf in workflows], ["W1"])
+
+
+if __name__ == "__main__":
+    unittest.main()
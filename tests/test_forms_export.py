@@ -0,0 +1,30 @@
+import unittest
+
+from ds_forms_export import parse_forms
+
+
+class ParseFormsTest(unittest.TestCase):
+    def test_header_right_after_section_brace(self):
+        # `form` på samme linje som seksjonens '{' skal gi formen
+        text = 'forms\n{ form F1\n {\n displayname = "A"\n }\n}\n'
+        forms = parse_forms(text)
+        self.assertEqual([f["form_name"] for f in forms], ["F1"])
+        self.assertEqual(forms[0]["display_name"], "A")
+
+    def test_field_block_right_after_form_brace(self):
+        # Feltblokk rett etter formens '{': displayname i feltet hører ikke
+        # til form-headeren
+        text = 'forms\n{\n form F1\n {Name\n (\n displayname = "Felt"\n )\n }\n}\n'
+        forms = parse_forms(text)
+        self.assertEqual(forms[0]["display_name"], "F1")
+
+    def test_header_without_own_block_keeps_next_header(self):
+        # F0 har ingen blokk og får F1 sin; F1 skal likevel eksporteres
+        text = 'forms\n{\n form F0\n form F1\n {\n displayname = "A"\n }\n}\n'
+        forms = parse_forms(text)
+        self.assertEqual([f["form_name"] for f in forms], ["F0", "F1"])
+        self.assertEqual(forms[0]["start_position"], forms[1]["start_position"])
+
+
+if __name__ == "__main__":
+    unittest.main()
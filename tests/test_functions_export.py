@@ -0,0 +1,37 @@
+import unittest
+
+from ds_functions_export import list_functions_with_code
+
+
+TEXT = """functions
+{
+ void ns.doIt(int a)
+ {
+  info a;
+ }
+ string plain()
+ {
+  return "";
+ }
+ map broken(
+}
+"""
+
+
+class ListFunctionsTest(unittest.TestCase):
+    def test_functions(self):
+        funcs = list_functions_with_code(TEXT)
+        self.assertEqual(
+            [(f["namespace"], f["name"], f["return_type"], f["header_line"]) for f in funcs],
+            [("ns", "doIt", "void", 3), (None, "plain", "string", 7)],
+        )
+        self.assertEqual(funcs[0]["body"], "\n  info a;\n ")
+        self.assertEqual(funcs[1]["full_source"], ' string plain()\n {\n  return "";\n }')
+
+    def test_include_source_no(self):
+        funcs = list_functions_with_code(TEXT, include_source="no")
+        self.assertTrue(all("body" not in f and "full_source" not in f for f in funcs))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,43 @@
+import unittest
+
+from ds_page_components_export import parse_components_from_content, parse_page_components
+
+
+def tags(content):
+    return [c["component_type"] for c in parse_components_from_content(content, "P", "")]
+
+
+class ComponentTagsTest(unittest.TestCase):
+    def test_only_component_tags(self):
+        self.assertEqual(tags("<div><report a='1'><span><form b='2'></div>"), ["report", "form"])
+
+    def test_tag_name_must_match_whole_word(self):
+        self.assertEqual(tags("<formula x='1'><reports><texts>"), [])
+
+    def test_component_inside_other_tags_attribute(self):
+        # Attributtene til <div> går frem til første '>', så <form ...> er en
+        # del av div-taggen, ikke en egen komponent
+        self.assertEqual(tags("<div title='<form x>'>"), [])
+        self.assertEqual(tags("<div title='<form x'><report r='1'>"), ["report"])
+
+    def test_quoted_tag_in_component_attribute(self):
+        comps = list(parse_components_from_content("<button title='<chart c>'>", "P", ""))
+        self.assertEqual([c["component_type"] for c in comps], ["button"])
+        self.assertEqual(comps[0]["zml"], "<button title='<chart c>")
+
+    def test_component_ids_count_components_only(self):
+        comps = list(parse_components_from_content("<div><text t='a'><p><image i='b'>", "P", ""))
+        self.assertEqual([(c["component_id"], c["order"]) for c in comps], [(1, 1), (2, 2)])
+
+
+class ParsePageComponentsTest(unittest.TestCase):
+    def test_page_right_after_pages_brace(self):
+        text = "pages\n{ page P1\n  {\n    Content=\"<report viewLinkName='R'>\"\n  }\n}\n"
+        comps = parse_page_components(text)
+        self.assertEqual(
+            [(c["page_name"], c["target_type"], c["target_name"]) for c in comps], [("P1", "report", "R")]
+        )
+
+
+if __name__ == "__main__":
+    unittest.main()
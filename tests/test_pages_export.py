@@ -0,0 +1,29 @@
+import unittest
+
+from ds_pages_export import parse_pages
+
+
+class ParsePagesTest(unittest.TestCase):
+    def test_header_right_after_section_brace(self):
+        text = "pages\n{ page P1\n {\n displayname = \"Side\"\n Content=\"<report viewLinkName='R'>\"\n }\n}\n"
+        pages = parse_pages(text)
+        self.assertEqual([p["page_name"] for p in pages], ["P1"])
+        self.assertEqual(pages[0]["display_name"], "Side")
+        self.assertEqual(pages[0]["content_length"], len("<report viewLinkName='R'>"))
+        self.assertEqual((pages[0]["start_line"], pages[0]["end_line"]), (2, 6))
+
+    def test_header_without_own_block_keeps_next_header(self):
+        # P0 får blokken til P1; Content uten sluttfnutt går ut blokken
+        text = 'pages\n{\n page P0\n page P1\n {\n Content="abc\n }\n}\n'
+        pages = parse_pages(text)
+        self.assertEqual([p["page_name"] for p in pages], ["P0", "P1"])
+        self.assertEqual(pages[0]["start_position"], pages[1]["start_position"])
+        self.assertEqual([p["start_line"] for p in pages], [2, 4])
+        self.assertEqual(pages[1]["content_length"], len("abc\n "))
+
+    def test_no_pages_section(self):
+        self.assertEqual(parse_pages("forms\n{\n}\n"), [])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,41 @@
+import unittest
+
+from ds_report_fields_export import parse_report_fields
+
+
+TEXT = """reports
+{
+ list R1
+ {
+ show all rows from F1
+ (Navn as "N"
+  Tall
+  (
+   width = 10
+  )
+  Lookup.ID as "L"
+ )
+ }
+}
+"""
+
+
+class ParseReportFieldsTest(unittest.TestCase):
+    def test_fields(self):
+        # Første felt står rett etter rows-blokkens '('
+        fields = parse_report_fields(TEXT)
+        self.assertEqual(
+            [(f["field_name"], f["display_name"], f["order"]) for f in fields],
+            [("Navn", "N", 1), ("Tall", None, 2), ("Lookup.ID", "L", 3)],
+        )
+        self.assertEqual(fields[1]["config"], "(\n   width = 10\n  )")
+        self.assertIsNone(fields[2]["config"])
+
+    def test_start_line_after_config_block(self):
+        # Linjenummeret peker på feltlinjen, også etter en konfig-blokk
+        fields = parse_report_fields(TEXT)
+        self.assertEqual([f["start_line"] for f in fields], [6, 7, 11])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,37 @@
+import unittest
+
+from ds_report_workflows_export import export_workflow_definitions
+
+
+TEXT = """workflow
+{
+ F1 as "Fun"
+ {
+  type = functions
+ }
+ F2 as "Form"
+ {
+  type = form
+ }
+ F3 as "Fun2"
+ {
+  type = functions
+ }
+}
+"""
+
+
+class ExportWorkflowDefinitionsTest(unittest.TestCase):
+    def test_only_function_workflows(self):
+        wfs = export_workflow_definitions(TEXT)
+        self.assertEqual([w["workflow_name"] for w in wfs], ["F1", "F3"])
+        self.assertEqual((wfs[0]["start_line"], wfs[0]["end_line"]), (3, 6))
+        self.assertEqual(wfs[0]["body"], "\n  type = functions\n ")
+
+    def test_referenced_only(self):
+        wfs = export_workflow_definitions(TEXT, referenced_only={"F3", "F2"})
+        self.assertEqual([w["workflow_name"] for w in wfs], ["F3"])
+
+
+if __name__ == "__main__":
+    unittest.main()
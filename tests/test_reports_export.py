@@ -0,0 +1,45 @@
+import unittest
+
+from ds_reports_export import parse_reports
+
+
+TEXT = """reports
+{ list R1
+ {
+ displayname = "Rap"
+ show all rows from F1
+ (
+ A
+ )
+ }
+ pivotchart R2
+ {
+ show rows from F2
+ (
+ B
+ )
+ }
+ default list R3
+ {
+ }
+}
+"""
+
+
+class ParseReportsTest(unittest.TestCase):
+    def test_headers_and_types(self):
+        # R1 står rett etter seksjonens '{'; pivotchart skal ikke bli pivot
+        reports = parse_reports(TEXT)
+        self.assertEqual(
+            [(r["report_name"], r["report_type"], r["base_form"]) for r in reports],
+            [("R1", "list", "F1"), ("R2", "pivotchart", "F2"), ("R3", "default list", None)],
+        )
+        self.assertEqual(reports[0]["display_name"], "Rap")
+        self.assertEqual([(r["start_line"], r["end_line"]) for r in reports], [(2, 9), (10, 16), (17, 19)])
+
+    def test_no_reports_section(self):
+        self.assertEqual(parse_reports("pages\n{\n}\n"), [])
+
+
+if __name__ == "__main__":
+    unittest.main()
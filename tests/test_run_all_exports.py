@@ -0,0 +1,50 @@
+import io
+import tempfile
+import unittest
+from contextlib import redirect_stdout
+from pathlib import Path
+
+import run_all_exports
+
+
+DS_TEXT = """forms
+{
+ form F1
+ {
+  displayname = "Skjema"
+  Navn
+  (
+   type = text
+  )
+ }
+}
+"""
+
+
+class RunAllOutputTest(unittest.TestCase):
+    def test_summary_follows_each_exporter(self):
+        # Hver eksportør skriver sin egen oppsummering rett etter Kjorer-linjen
+        scripts = ["ds_forms_export.py", "ds_form_fields_export.py", "ds_pages_export.py"]
+        with tempfile.TemporaryDirectory() as tmp:
+            outdir = Path(tmp)
+            ds_file = outdir / "app.ds"
+            ds_file.write_text(DS_TEXT, encoding="utf-8")
+            output = io.StringIO()
+            with redirect_stdout(output):
+                results = run_all_exports.run_all_in_process(scripts, run_all_exports.DsInput(ds_file), outdir)
+            self.assertEqual(results, [True, True, True])
+            self.assertEqual(
+                output.getvalue().splitlines(),
+                [
+                    f"Kjorer: ds_forms_export.py -> {outdir / 'forms.json'}",
+                    f"1 form(er) eksportert til {outdir / 'forms.json'}",
+                    f"Kjorer: ds_form_fields_export.py -> {outdir / 'form_fields.json'}",
+                    f"Skrev 1 felter til: {outdir / 'form_fields.json'}",
+                    f"Kjorer: ds_pages_export.py -> {outdir / 'pages.json'}",
+                    f"0 page(s) eksportert til {outdir / 'pages.json'}",
+                ],
+            )
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,63 @@
+import unittest
+
+from ds_schedule_workflows_export import extract_key_values, parse_schedule_workflows
+
+
+TEXT = """workflow
+{
+ schedule
+ {  S1 as "Plan"
+  {
+   type = schedule
+   form = F1
+   time zone = "Europe/Oslo"
+   on start
+   {on load
+    (
+     x = "})";
+    )
+   }
+  }
+ }
+}
+"""
+
+
+class ParseScheduleWorkflowsTest(unittest.TestCase):
+    def test_workflow_settings(self):
+        wfs = parse_schedule_workflows(TEXT, include_source="no")
+        self.assertEqual(len(wfs), 1)
+        wf = wfs[0]
+        self.assertEqual((wf["workflow_name"], wf["display_name"]), ("S1", "Plan"))
+        self.assertEqual((wf["type"], wf["form_name"], wf["time_zone"]), ("schedule", "F1", "Europe/Oslo"))
+        self.assertEqual((wf["start_line"], wf["end_line"]), (4, 15))
+
+    def test_action_right_after_event_brace(self):
+        # Action-headeren står rett etter '{', og skriptet har klammer og
+        # parenteser inni en streng
+        events = parse_schedule_workflows(TEXT, include_source="no")[0]["events"]
+        self.assertEqual(
+            events,
+            [{"event_type": "on start", "actions": [{"action_type": "on load", "script": 'x = "})";'}]}],
+        )
+
+    def test_no_schedule_section(self):
+        self.assertEqual(parse_schedule_workflows("workflow\n{\n form\n {\n }\n}\n"), [])
+
+
+
+class ExtractKeyValuesTest(unittest.TestCase):
+    def test_empty_value_stays_on_its_line(self):
+        # En tom verdi gir '' i stedet for å hente neste linje som verdi
+        block = " type = \n time zone = Europe/Oslo\n"
+        self.assertEqual(
+            extract_key_values(block, ("type", "time zone")), {"type": "", "time zone": "Europe/Oslo"}
+        )
+
+    def test_first_non_empty_value_wins(self):
+        block = "type =\nType = schedule\ntype = other\n"
+        self.assertEqual(extract_key_values(block, ("type", "form")), {"type": "schedule", "form": ""})
+
+
+if __name__ == "__main__":
+    unittest.main()